@@ -0,0 +1,59 @@
+"""foreign key and lookup indexes
+
+Built with CREATE INDEX CONCURRENTLY so writes keep going while they build.
+That can't run in a transaction, so the indexes are created in an autocommit
+block. The unique ones fail on existing duplicate rows, remove those and
+run the upgrade again: indexes that already built are skipped, the INVALID
+leftovers of the ones that didn't are dropped and rebuilt.
+
+Revision ID: 440db06c878a
+Revises: e2224deb87e2
+Create Date: 2026-10-18 13:26:51.640127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '440db06c878a'
+down_revision = 'e2224deb87e2'
+branch_labels = None
+depends_on = None
+
+# (name, table, columns, unique)
+INDEXES = [
+    ('ix_posts_owner_id_id', 'posts', ['owner_id', 'id'], False),
+    ('ix_votes_post_id', 'votes', ['post_id'], False),
+    ('ix_refresh_tokens_user_id', 'refresh_tokens', ['user_id'], False),
+    ('uq_doctors_user_id', 'doctors', ['user_id'], True),
+    ('uq_patients_user_id', 'patients', ['user_id'], True),
+    ('uq_doctor_patient_doctor_id_patient_id', 'doctor_patient', ['doctor_id', 'patient_id'], True),
+    ('ix_doctor_patient_patient_id', 'doctor_patient', ['patient_id'], False),
+    ('uq_doctor_requests_patient_id_doctor_id', 'doctor_requests', ['patient_id', 'doctor_id'], True),
+    ('ix_doctor_requests_doctor_id', 'doctor_requests', ['doctor_id'], False),
+    ('uq_patient_requests_doctor_id_patient_id', 'patient_requests', ['doctor_id', 'patient_id'], True),
+    ('ix_patient_requests_patient_id', 'patient_requests', ['patient_id'], False),
+    ('ix_questions_patient_id', 'questions', ['patient_id'], False),
+    ('ix_answers_question_id', 'answers', ['question_id'], False),
+    ('ix_comments_question_id', 'comments', ['question_id'], False),
+    ('ix_comments_answer_id', 'comments', ['answer_id'], False),
+]
+
+
+def upgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in INDEXES:
+            valid = op.get_bind().execute(sa.text(
+                'SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)'), {'name': name}).scalar()
+            if valid:
+                continue
+            if valid is not None:
+                op.execute(f'DROP INDEX CONCURRENTLY {name}')
+            op.create_index(name, table, columns, unique=unique, postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        for name, table, columns, unique in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True)
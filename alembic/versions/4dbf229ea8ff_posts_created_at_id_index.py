@@ -0,0 +1,23 @@
+"""posts created_at id index for keyset pagination
+
+Revision ID: 4dbf229ea8ff
+Revises: 11af8233a919
+Create Date: 2026-10-18 09:12:40.118302
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '4dbf229ea8ff'
+down_revision = '11af8233a919'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_posts_created_at_id', 'posts', ['created_at', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_posts_created_at_id', table_name='posts')
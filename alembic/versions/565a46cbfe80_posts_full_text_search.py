@@ -0,0 +1,39 @@
+"""posts full text search vector
+
+Adding a STORED generated column rewrites the whole posts table under an
+ACCESS EXCLUSIVE lock, reads and writes of posts wait until it is done, so
+on a big table run this in a maintenance window. The GIN index afterwards
+is built with CREATE INDEX CONCURRENTLY in an autocommit block and doesn't
+block writes.
+
+Revision ID: 565a46cbfe80
+Revises: 70c598f65556
+Create Date: 2026-10-18 11:26:04.672013
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = '565a46cbfe80'
+down_revision = '70c598f65556'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # stored generated column, postgres computes it for existing rows and
+    # keeps it current on every insert/update of title or content
+    op.add_column('posts', sa.Column('search_vector', postgresql.TSVECTOR(), sa.Computed(
+        "to_tsvector('english', title || ' ' || content)", persisted=True), nullable=True))
+    with op.get_context().autocommit_block():
+        op.create_index('ix_posts_search_vector', 'posts', ['search_vector'], unique=False,
+                        postgresql_using='gin', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_posts_search_vector', table_name='posts', postgresql_concurrently=True)
+    op.drop_column('posts', 'search_vector')
@@ -0,0 +1,30 @@
+"""add vote_count to posts
+
+Revision ID: 70c598f65556
+Revises: 4dbf229ea8ff
+Create Date: 2026-10-18 10:03:27.540961
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '70c598f65556'
+down_revision = '4dbf229ea8ff'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('vote_count', sa.Integer(), server_default='0', nullable=False))
+    # backfill from the existing votes, from here on the vote router keeps it in sync
+    op.execute("""
+        UPDATE posts SET vote_count = counts.votes
+        FROM (SELECT post_id, COUNT(*) AS votes FROM votes GROUP BY post_id) AS counts
+        WHERE posts.id = counts.post_id
+    """)
+
+
+def downgrade():
+    op.drop_column('posts', 'vote_count')
@@ -0,0 +1,33 @@
+"""add post trending
+
+Revision ID: e2224deb87e2
+Revises: feef7020f502
+Create Date: 2026-10-18 12:41:17.905524
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e2224deb87e2'
+down_revision = 'feef7020f502'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # filled by the app's background refresher on its first round
+    op.create_table('post_trending',
+                    sa.Column('post_id', sa.Integer(), nullable=False),
+                    sa.Column('score', sa.Float(), nullable=False),
+                    sa.Column('vote_count', sa.Integer(), nullable=False),
+                    sa.Column('refreshed_at', sa.TIMESTAMP(timezone=True), nullable=False),
+                    sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('post_id'))
+    op.create_index('ix_post_trending_score_post_id', 'post_trending', ['score', 'post_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_post_trending_score_post_id', table_name='post_trending')
+    op.drop_table('post_trending')
@@ -0,0 +1,37 @@
+"""add refresh tokens
+
+Revision ID: feef7020f502
+Revises: 565a46cbfe80
+Create Date: 2026-10-18 12:04:51.318207
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'feef7020f502'
+down_revision = '565a46cbfe80'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('refresh_tokens',
+                    sa.Column('id', sa.Integer(), nullable=False),
+                    sa.Column('user_id', sa.Integer(), nullable=False),
+                    sa.Column('token_hash', sa.String(), nullable=False),
+                    sa.Column('family_id', sa.String(), nullable=False),
+                    sa.Column('created_at', sa.TIMESTAMP(timezone=True),
+                              server_default=sa.text('now()'), nullable=False),
+                    sa.Column('expires_at', sa.TIMESTAMP(timezone=True), nullable=False),
+                    sa.Column('revoked_at', sa.TIMESTAMP(timezone=True), nullable=True),
+                    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+                    sa.PrimaryKeyConstraint('id'),
+                    sa.UniqueConstraint('token_hash'))
+    op.create_index(op.f('ix_refresh_tokens_family_id'), 'refresh_tokens', ['family_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_refresh_tokens_family_id'), table_name='refresh_tokens')
+    op.drop_table('refresh_tokens')
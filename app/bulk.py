@@ -0,0 +1,125 @@
+import csv
+import io
+from typing import AsyncIterator, List
+
+import orjson
+from pydantic import ValidationError
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models, schemas
+
+IMPORT_COLUMNS = ("title", "content", "published", "owner_id")
+EXPORT_COLUMNS = ("id", "title", "content", "published", "created_at", "owner_id")
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]):
+    """Split a streamed body into lines without holding more than one chunk."""
+    remainder = b""
+    async for chunk in chunks:
+        lines = (remainder + chunk).split(b"\n")
+        remainder = lines.pop()
+        for line in lines:
+            yield line
+    if remainder:
+        yield remainder
+
+
+async def iter_records(lines: AsyncIterator[bytes], format: schemas.BulkFormat):
+    """(line number, dict) per row, or (line number, error) for rows that don't parse."""
+    header = None
+    pending, start = "", 0
+    number = 0
+    async for line in lines:
+        number += 1
+        try:
+            text = line.decode("utf-8-sig" if number == 1 else "utf-8").rstrip("\r")
+        except UnicodeDecodeError as error:
+            yield number, error
+            continue
+        if format == schemas.BulkFormat.NDJSON:
+            if not text.strip():
+                continue
+            try:
+                yield number, orjson.loads(text)
+            except orjson.JSONDecodeError as error:
+                yield number, error
+            continue
+
+        # a quoted CSV field may span lines, keep reading until the quotes balance
+        if not pending:
+            start = number
+        pending = pending + "\n" + text if pending else text
+        if pending.count('"') % 2:
+            continue
+        row, pending = next(csv.reader([pending])), ""
+        if header is None:
+            header = row
+        elif row:
+            yield start, dict(zip(header, row))
+    if pending:
+        yield start, ValueError("unterminated quoted field")
+
+
+async def import_posts(db: AsyncSession, chunks: AsyncIterator[bytes], format: schemas.BulkFormat,
+                       owner_id: int, chunk_size: int, max_errors: int):
+    """COPY the valid rows of an NDJSON/CSV body into posts, chunk_size rows at a time.
+
+    Runs in the session's transaction, the caller commits. Rows that fail
+    validation are skipped and reported, the first max_errors in detail.
+    """
+    # COPY goes straight to asyncpg, the statement through the session opens
+    # the transaction it then joins
+    await db.execute(select(1))
+    connection = (await (await db.connection()).get_raw_connection()).connection._connection
+
+    imported, error_count, errors = 0, 0, []
+    batch: List[tuple] = []
+
+    async def flush():
+        nonlocal imported, batch
+        if batch:
+            await connection.copy_records_to_table("posts", records=batch, columns=IMPORT_COLUMNS)
+            imported += len(batch)
+            batch = []
+
+    async for number, record in iter_records(iter_lines(chunks), format):
+        try:
+            if isinstance(record, Exception):
+                raise record
+            post = schemas.PostCreate.parse_obj(record)
+        except (ValidationError, ValueError, TypeError) as error:
+            error_count += 1
+            if len(errors) < max_errors:
+                errors.append({"line": number, "error": str(error)})
+            continue
+        batch.append((post.title, post.content, post.published, owner_id))
+        if len(batch) >= chunk_size:
+            await flush()
+    await flush()
+
+    return {"imported": imported, "error_count": error_count, "errors": errors}
+
+
+async def export_posts(db: AsyncSession, owner_id: int, format: schemas.BulkFormat, chunk_size: int):
+    """Yield the owner's posts as NDJSON or CSV, chunk_size rows per server side fetch."""
+    result = await db.stream(select(*(getattr(models.Post, column) for column in EXPORT_COLUMNS)).where(
+        models.Post.owner_id == owner_id).order_by(models.Post.id).execution_options(yield_per=chunk_size))
+
+    if format == schemas.BulkFormat.CSV:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        async for rows in result.partitions():
+            for row in rows:
+                writer.writerow([value.isoformat() if column == "created_at" else value
+                                 for column, value in zip(EXPORT_COLUMNS, row)])
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue().encode()
+        return
+
+    async for rows in result.partitions():
+        yield b"".join(orjson.dumps(dict(row._mapping)) + b"\n" for row in rows)
@@ -0,0 +1,125 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from .config import settings
+
+
+class TTLCache:
+    """Thread safe LRU cache with per entry expiry, local to the worker process."""
+
+    def __init__(self, max_size: int = 1024, ttl: Optional[float] = 60):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    # the same async interface as RedisCache, a lookup in memory never blocks
+    async def get_async(self, key: str, default=None):
+        return self.get(key, default)
+
+    async def set_async(self, key: str, value, ttl: Optional[float] = None):
+        self.set(key, value, ttl)
+
+    async def delete_async(self, key: str):
+        self.delete(key)
+
+    def stats(self):
+        return {"backend": "memory", "size": len(self._data), "max_size": self.max_size,
+                "hits": self.hits, "misses": self.misses}
+
+
+class RedisCache:
+    """TTLCache interface on top of redis, shared by every worker.
+
+    Values must be JSON serializable. Needs the optional `redis` package.
+    The client is synchronous, async code goes through the *_async methods,
+    which run it in the threadpool so a round trip doesn't stall the loop.
+    """
+
+    def __init__(self, url: str, prefix: str, ttl: Optional[float] = 60):
+        import redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self.hits = 0
+        self.misses = 0
+        self._client = redis.Redis.from_url(url)
+
+    def get(self, key: str, default=None):
+        raw = self._client.get(self.prefix + key)
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(raw)
+
+    def set(self, key: str, value, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        px = int(ttl * 1000) if ttl is not None else None
+        self._client.set(self.prefix + key, json.dumps(value, default=str), px=px)
+
+    def delete(self, key: str):
+        self._client.delete(self.prefix + key)
+
+    def clear(self):
+        for key in self._client.scan_iter(match=self.prefix + "*"):
+            self._client.delete(key)
+
+    async def get_async(self, key: str, default=None):
+        return await run_in_threadpool(self.get, key, default)
+
+    async def set_async(self, key: str, value, ttl: Optional[float] = None):
+        await run_in_threadpool(self.set, key, value, ttl)
+
+    async def delete_async(self, key: str):
+        await run_in_threadpool(self.delete, key)
+
+    def stats(self):
+        return {"backend": "redis", "hits": self.hits, "misses": self.misses}
+
+
+def create_cache(name: str, max_size: int, ttl: Optional[float]):
+    # a shared backend keeps invalidations consistent across gunicorn workers,
+    # the in process default only invalidates the worker that saw the change
+    if settings.cache_url:
+        return RedisCache(settings.cache_url, prefix=f"{name}:", ttl=ttl)
+    return TTLCache(max_size=max_size, ttl=ttl)
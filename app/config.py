@@ -1,3 +1,5 @@
+from typing import Optional
+
 from pydantic import BaseSettings
 
 class Settings(BaseSettings):
@@ -9,6 +11,61 @@ class Settings(BaseSettings):
     secret_key: str
     algorithm: str
     access_token_expire_minutes: int
+    refresh_token_expire_days: int = 30
+    # connection pool, sized per worker process: gunicorn -w 4 opens up to
+    # 4 * (pool_size + max_overflow) connections per engine
+    database_pool_size: int = 5
+    database_max_overflow: int = 10
+    database_pool_timeout: int = 30
+    database_pool_recycle: int = 1800
+    database_pool_pre_ping: bool = True
+    # read only routes use the replica when one is configured; a client that
+    # just wrote keeps reading from the primary for read_your_writes_seconds
+    database_replica_hostname: Optional[str] = None
+    database_replica_port: Optional[str] = None
+    read_your_writes_seconds: int = 5
+    # redis://... to share caches between workers, in process caches otherwise
+    cache_url: Optional[str] = None
+    user_cache_ttl_seconds: int = 60
+    user_cache_max_size: int = 10000
+    token_cache_max_size: int = 10000
+    response_cache_ttl_seconds: int = 300
+    # without cache_url a write only invalidates its own worker's entries,
+    # so the others may serve a stale response for at most this long
+    response_cache_local_ttl_seconds: int = 5
+    response_cache_max_size: int = 10000
+    # response compression, content types are comma separated
+    compression_minimum_size: int = 500
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+    compression_content_types: str = "application/json,application/x-ndjson,text/csv"
+    compression_cache_max_size: int = 1000
+    # slow query log, off while the threshold is 0. explain_top_n > 0 also
+    # samples EXPLAIN (ANALYZE, BUFFERS) for the slowest SELECTs per interval
+    slow_query_threshold_ms: int = 0
+    slow_query_explain_top_n: int = 0
+    slow_query_explain_interval_seconds: int = 60
+    # password hashing process pool, logins and sign ups get a 429 once
+    # password_hash_max_pending hashes are queued or running in this worker
+    bcrypt_rounds: int = 12
+    password_hash_workers: int = 2
+    password_hash_max_pending: int = 32
+    # POST /vote waits up to vote_coalesce_window_ms to share one statement
+    # with other votes, 0 writes every vote on its own
+    vote_coalesce_window_ms: int = 0
+    vote_coalesce_max_items: int = 100
+    vote_batch_max_items: int = 1000
+    # bulk post import/export, rows per COPY and per server side cursor fetch
+    post_import_chunk_size: int = 5000
+    post_import_max_errors: int = 100
+    post_export_chunk_size: int = 1000
+    # rows per server side fetch for ?stream= list responses
+    stream_chunk_size: int = 500
+    # /posts/trending, refreshed in the background every trending_refresh_seconds
+    # (0 turns the refresher off) from posts of the last trending_window_hours
+    trending_refresh_seconds: int = 60
+    trending_window_hours: int = 72
+    trending_gravity: float = 1.8
 
     class Config:
         env_file = ".env"
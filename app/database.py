@@ -1,18 +1,141 @@
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, exc
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 import psycopg2
 from psycopg2.extras import RealDictCursor
+import hashlib
+import logging
+import threading
 import time
+from http.cookies import CookieError, SimpleCookie
+from starlette.datastructures import Headers
+from . import cache, metrics
+from .slow_queries import SlowQueryLog
 from .config import settings
 
+logger = logging.getLogger(__name__)
+
 SQLALCHEMY_DATABASE_URL = f'postgresql://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}'
+ASYNC_SQLALCHEMY_DATABASE_URL = f'postgresql+asyncpg://{settings.database_username}:{settings.database_password}@{settings.database_hostname}:{settings.database_port}/{settings.database_name}'
+
+
+
+class PoolStats:
+    """Checkout counters for one connection pool in this worker process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def record(self, wait_seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_seconds_total += wait_seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, wait_seconds)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_ms_avg": self.wait_seconds_total / self.checkouts * 1000 if self.checkouts else 0.0,
+                "wait_ms_max": self.wait_seconds_max * 1000,
+            }
+
+
+class InstrumentedPoolMixin:
+    """Times every checkout, including queueing for a free connection and the pre-ping."""
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.stats = PoolStats()
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.stats.record(time.perf_counter() - start, timed_out=True)
+            logger.warning("connection pool exhausted: %s", pool_status(self))
+            raise
+        self.stats.record(time.perf_counter() - start)
+        return connection
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
 
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+
+pool_options = dict(
+    pool_size=settings.database_pool_size,
+    max_overflow=settings.database_max_overflow,
+    pool_timeout=settings.database_pool_timeout,
+    pool_recycle=settings.database_pool_recycle,
+    pool_pre_ping=settings.database_pool_pre_ping,
+)
+
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=InstrumentedQueuePool, **pool_options)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# async routers run on the event loop through asyncpg instead of tying up a
+# threadpool worker per request. expire_on_commit is off because expired
+# attributes can't be lazily reloaded outside of an await
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL,
+                                   poolclass=InstrumentedAsyncAdaptedQueuePool, **pool_options)
+
+AsyncSessionLocal = sessionmaker(async_engine, class_=AsyncSession, autocommit=False,
+                                 autoflush=False, expire_on_commit=False)
+
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+
+if settings.slow_query_threshold_ms > 0:
+    slow_query_log = SlowQueryLog(settings.slow_query_threshold_ms,
+                                  explain_top_n=settings.slow_query_explain_top_n,
+                                  explain_interval=settings.slow_query_explain_interval_seconds,
+                                  explain_engine=engine)
+    slow_query_log.instrument(engine)
+    slow_query_log.instrument(async_engine.sync_engine)
+else:
+    slow_query_log = None
+
+if settings.database_replica_hostname:
+    REPLICA_SQLALCHEMY_DATABASE_URL = f'postgresql+asyncpg://{settings.database_username}:{settings.database_password}@{settings.database_replica_hostname}:{settings.database_replica_port or settings.database_port}/{settings.database_name}'
+
+    replica_engine = create_async_engine(REPLICA_SQLALCHEMY_DATABASE_URL,
+                                         poolclass=InstrumentedAsyncAdaptedQueuePool, **pool_options)
+
+    ReplicaSessionLocal = sessionmaker(replica_engine, class_=AsyncSession, autocommit=False,
+                                       autoflush=False, expire_on_commit=False)
+    metrics.instrument_engine(replica_engine.sync_engine)
+    if slow_query_log is not None:
+        slow_query_log.instrument(replica_engine.sync_engine)
+else:
+    replica_engine = None
+    ReplicaSessionLocal = AsyncSessionLocal
+
+# digests of the bearer tokens that wrote within the read-your-writes window,
+# per worker unless CACHE_URL points all of them at one shared backend
+recent_writers = cache.create_cache(
+    "recent_writes", max_size=100000, ttl=settings.read_your_writes_seconds)
+
+# the same marker travels with the client as a cookie holding the end of its
+# window, so a read served by another worker than the write still sees it
+READ_YOUR_WRITES_COOKIE = "read_your_writes"
+
 Base = declarative_base()
 
 
@@ -24,6 +147,106 @@ def get_db():
         db.close()
 
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def _writer_key(headers: Headers):
+    authorization = headers.get("authorization")
+    if authorization:
+        return hashlib.sha256(authorization.encode()).hexdigest()
+
+
+async def record_write(headers: Headers):
+    key = _writer_key(headers)
+    if key is not None and settings.read_your_writes_seconds > 0:
+        await recent_writers.set_async(key, True)
+
+
+def write_cookie():
+    seconds = settings.read_your_writes_seconds
+    return (f"{READ_YOUR_WRITES_COOKIE}={int(time.time()) + seconds}; Max-Age={seconds}; "
+            "Path=/; HttpOnly; SameSite=Lax")
+
+
+def _wrote_recently(headers: Headers):
+    # a forged cookie only moves the client's own reads to the primary
+    cookie = SimpleCookie()
+    try:
+        cookie.load(headers.get("cookie", ""))
+        morsel = cookie.get(READ_YOUR_WRITES_COOKIE)
+        return morsel is not None and float(morsel.value) > time.time()
+    except (CookieError, ValueError):
+        return False
+
+
+async def read_session_factory(headers: Headers):
+    if ReplicaSessionLocal is AsyncSessionLocal:
+        return AsyncSessionLocal
+    if _wrote_recently(headers):
+        return AsyncSessionLocal
+    key = _writer_key(headers)
+    if key is not None and await recent_writers.get_async(key):
+        return AsyncSessionLocal
+    return ReplicaSessionLocal
+
+
+async def get_read_db(request: Request):
+    async with (await read_session_factory(request.headers))() as db:
+        yield db
+
+
+class ReadYourWritesMiddleware:
+    """Remembers clients whose non-GET requests succeeded, see read_session_factory.
+
+    Marks them in recent_writers and with a cookie, the cookie reaches every
+    worker while clients that don't keep cookies rely on the cache.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS")
+                or ReplicaSessionLocal is AsyncSessionLocal or settings.read_your_writes_seconds <= 0):
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            # record before the response goes out so the client's next read
+            # is already pinned to the primary
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                await record_write(Headers(scope=scope))
+                message = {**message, "headers": [
+                    *message.get("headers", []), (b"set-cookie", write_cookie().encode("latin-1"))]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+def pool_status(pool):
+    status = {
+        "size": pool.size(),
+        "checked_in": pool.checkedin(),
+        "checked_out": pool.checkedout(),
+        "overflow": pool.overflow(),
+    }
+    if isinstance(pool, InstrumentedPoolMixin):
+        status.update(pool.stats.as_dict())
+    return status
+
+
+def engine_pool_status():
+    status = {
+        "sync": pool_status(engine.pool),
+        "async": pool_status(async_engine.sync_engine.pool),
+    }
+    if replica_engine is not None:
+        status["replica"] = pool_status(replica_engine.sync_engine.pool)
+    return status
+
+
 # while True:
 
 #     try:
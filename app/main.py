@@ -1,15 +1,19 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 
-from . import models
-from .database import engine
-from .routers import post, user, auth, vote, llm, doctor_patient
+from . import models, trending, utils, votes
+from .compression import CompressionMiddleware
+from .metrics import MetricsMiddleware
+from .responses import ORJSONResponse
+from .database import engine, async_engine, replica_engine, ReadYourWritesMiddleware
+from .routers import post, user, auth, vote, llm, doctor_patient, health, metrics
 from .config import settings
 
 
 # models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 #place website url in origins eventually
 origins = ["*"]
@@ -20,7 +24,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"], #maybe modify to only allow GET for security
     allow_headers=["*"],
+    # response headers browsers may read cross origin
+    expose_headers=["X-Next-Cursor", "ETag", "X-Trending-Refreshed-At", "X-Trending-Age-Seconds"],
 )
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.compression_minimum_size,
+    gzip_level=settings.compression_gzip_level,
+    brotli_quality=settings.compression_brotli_quality,
+    content_types=[content_type.strip() for content_type in settings.compression_content_types.split(",")],
+    cache_size=settings.compression_cache_max_size,
+)
+# outermost, so latency includes every other middleware
+app.add_middleware(MetricsMiddleware, router_app=app)
 
 app.include_router(post.router)
 app.include_router(user.router)
@@ -28,7 +45,43 @@ app.include_router(auth.router)
 app.include_router(vote.router)
 app.include_router(llm.router)
 app.include_router(doctor_patient.router)
+app.include_router(health.router)
+app.include_router(metrics.router)
+
+
+
+@app.exception_handler(utils.PasswordHasherBusy)
+def password_hasher_busy(request: Request, exc: utils.PasswordHasherBusy):
+    return JSONResponse(status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                        content={"detail": "Too many password checks in progress, try again shortly"},
+                        headers={"Retry-After": "1"})
+
+
+@app.on_event("startup")
+def start_trending_refresher():
+    trending.refresher.start()
+
+
+@app.on_event("shutdown")
+async def stop_trending_refresher():
+    await trending.refresher.stop()
+
+
+@app.on_event("shutdown")
+async def flush_vote_buffer():
+    await votes.vote_buffer.drain()
+
+
+@app.on_event("shutdown")
+async def dispose_async_engine():
+    await async_engine.dispose()
+    if replica_engine is not None:
+        await replica_engine.dispose()
+
 
+@app.on_event("shutdown")
+def shutdown_password_pool():
+    utils.shutdown_password_pool()
 
 
 @app.get("/")
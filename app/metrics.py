@@ -0,0 +1,202 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional, Sequence, Tuple
+
+from sqlalchemy import event
+from starlette.routing import Match
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: Tuple[Tuple[str, str], ...] = ()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            lines.extend(self._render_value(labels, value))
+        return lines
+
+    def _render_value(self, labels, value):
+        return [f"{self.name}{_format_labels(self.labelnames, labels)} {value}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, *labels, value: float):
+        with self._lock:
+            counts, total = self._values.get(labels, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[labels] = (counts, total + value)
+
+    def _render_value(self, labels, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, (('le', le),))} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}")
+        return lines
+
+
+requests_total = Counter(
+    "http_requests_total", "Requests by route and status code.", ("method", "route", "status"))
+request_duration = Histogram(
+    "http_request_duration_seconds", "Request latency by route.", ("method", "route"))
+requests_in_flight = Gauge(
+    "http_requests_in_flight", "Requests currently being served.", ("method", "route"))
+request_phase_duration = Histogram(
+    "http_request_phase_seconds",
+    "Time per request spent in auth, db, serialization and the rest of the handler.",
+    ("method", "route", "phase"))
+
+REGISTRY = (requests_total, request_duration, requests_in_flight, request_phase_duration)
+
+
+def render_latest():
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+# phase -> seconds for the request being served, shared with the threadpool and
+# the asyncpg greenlets since both copy the context they start from
+_timings: ContextVar[Optional[dict]] = ContextVar("request_timings", default=None)
+# route template of the request being served, for logs outside of the handler
+current_route: ContextVar[Optional[str]] = ContextVar("current_route", default=None)
+
+
+def record(phase: str, seconds: float):
+    timings = _timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + seconds
+
+
+@contextmanager
+def collect_timings():
+    """Collects the phases recorded inside the block into the dict it yields."""
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+@contextmanager
+def timed(phase: str):
+    """Adds the block's time to phase, minus whatever phases nested inside it recorded."""
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+    nested_before = sum(timings.values())
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings[phase] = timings.get(phase, 0.0) + elapsed - (sum(timings.values()) - nested_before)
+
+
+def instrument_engine(engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def stop_timer(conn, cursor, statement, parameters, context, executemany):
+        record("db", time.perf_counter() - conn.info["metrics_start"].pop())
+
+
+def route_name(app, scope):
+    # the path template keeps the label set bounded, /posts/{id} and not /posts/42
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+
+class MetricsMiddleware:
+    """Records latency, status codes, in flight requests and the per phase breakdown."""
+
+    def __init__(self, app, router_app=None):
+        self.app = app
+        self.router_app = router_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_name(self.router_app, scope)
+        status_code = 500
+        route_token = current_route.set(route)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        requests_in_flight.inc(method, route)
+        start = time.perf_counter()
+        try:
+            with collect_timings() as timings:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            current_route.reset(route_token)
+            requests_in_flight.dec(method, route)
+            requests_total.inc(method, route, str(status_code))
+            request_duration.observe(method, route, value=elapsed)
+            for phase in ("auth", "db", "serialization"):
+                request_phase_duration.observe(method, route, phase, value=timings.get(phase, 0.0))
+            request_phase_duration.observe(method, route, "handler", value=max(elapsed - sum(timings.values()), 0.0))
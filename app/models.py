@@ -1,5 +1,6 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Table, Enum as SQLEnum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Computed, Float, Integer, String, Boolean, ForeignKey, Table, Index, Enum as SQLEnum
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql.expression import text
 from sqlalchemy.sql.sqltypes import TIMESTAMP
 from enum import Enum
@@ -18,7 +19,9 @@ class RequestStatus(str, Enum):
 # Define association tables for many-to-many relationships
 doctor_patient_table = Table('doctor_patient', Base.metadata,
     Column('doctor_id', Integer, ForeignKey('doctors.id', ondelete="CASCADE")),
-    Column('patient_id', Integer, ForeignKey('patients.id', ondelete="CASCADE"))
+    Column('patient_id', Integer, ForeignKey('patients.id', ondelete="CASCADE")),
+    Index('uq_doctor_patient_doctor_id_patient_id', 'doctor_id', 'patient_id', unique=True),
+    Index('ix_doctor_patient_patient_id', 'patient_id'),
 )
 
 doctor_specialty_table = Table('doctor_specialty', Base.metadata,
@@ -37,8 +40,23 @@ class Post(Base):
                         nullable=False, server_default=text('now()'))
     owner_id = Column(Integer, ForeignKey(
         "users.id", ondelete="CASCADE"), nullable=False)
+    # maintained by the vote router in the same transaction as the vote row
+    vote_count = Column(Integer, server_default='0', nullable=False)
+    # generated by postgres for full text search, deferred so regular post
+    # queries don't ship the vector over the wire
+    search_vector = deferred(Column(TSVECTOR, Computed(
+        "to_tsvector('english', title || ' ' || content)", persisted=True)))
 
-    owner = relationship("User")
+    # routes must eager load the owner, an accidental N+1 raises instead
+    owner = relationship("User", lazy="raise_on_sql")
+
+    __table_args__ = (
+        # backs keyset pagination in get_posts
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_search_vector", "search_vector", postgresql_using="gin"),
+        # the owner's posts in id order for /posts/export, and the users cascade
+        Index("ix_posts_owner_id_id", "owner_id", "id"),
+    )
 
 
 class User(Base):
@@ -61,6 +79,49 @@ class Vote(Base):
         "users.id", ondelete="CASCADE"), primary_key=True)
     post_id = Column(Integer, ForeignKey(
         "posts.id", ondelete="CASCADE"), primary_key=True)
+
+    __table_args__ = (
+        # the primary key leads with user_id, vote counts and the posts
+        # cascade look votes up by post
+        Index("ix_votes_post_id", "post_id"),
+    )
+
+
+class PostTrending(Base):
+    """Ranking behind /posts/trending, rebuilt by app/trending.py."""
+    __tablename__ = "post_trending"
+
+    post_id = Column(Integer, ForeignKey(
+        "posts.id", ondelete="CASCADE"), primary_key=True)
+    score = Column(Float, nullable=False)
+    vote_count = Column(Integer, nullable=False)
+    refreshed_at = Column(TIMESTAMP(timezone=True), nullable=False)
+
+    __table_args__ = (
+        # the feed is read straight off this index, backwards
+        Index("ix_post_trending_score_post_id", "score", "post_id"),
+    )
+
+
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True, nullable=False)
+    user_id = Column(Integer, ForeignKey(
+        "users.id", ondelete="CASCADE"), nullable=False)
+    # HMAC of the token, the token itself is only ever held by the client
+    token_hash = Column(String, nullable=False, unique=True)
+    # every token rotated out of the same login, revoked together on reuse
+    family_id = Column(String, nullable=False, index=True)
+    created_at = Column(TIMESTAMP(timezone=True),
+                        nullable=False, server_default=text('now()'))
+    expires_at = Column(TIMESTAMP(timezone=True), nullable=False)
+    revoked_at = Column(TIMESTAMP(timezone=True), nullable=True)
+
+    __table_args__ = (
+        Index("ix_refresh_tokens_user_id", "user_id"),
+    )
+
     
 class Doctor(Base):
     __tablename__ = "doctors"
@@ -68,6 +129,9 @@ class Doctor(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
     degree = Column(String, nullable=False)
+
+    # one doctor profile per user, the token claims look it up by user_id
+    __table_args__ = (Index("uq_doctors_user_id", "user_id", unique=True),)
     user = relationship("User", back_populates="doctor")
     doctor_requests = relationship("DoctorRequest", back_populates="doctor")
     patient_requests = relationship("PatientRequest", back_populates="doctor")
@@ -86,6 +150,8 @@ class Patient(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey('users.id', ondelete="CASCADE"), nullable=False)
     user = relationship("User", back_populates="patient")
+
+    __table_args__ = (Index("uq_patients_user_id", "user_id", unique=True),)
     doctor_requests = relationship("DoctorRequest", back_populates="patient")
     patient_requests = relationship("PatientRequest", back_populates="patient")
 
@@ -119,6 +185,12 @@ class DoctorRequest(Base):
     doctor = relationship("Doctor", back_populates="doctor_requests")
     patient = relationship("Patient", back_populates="doctor_requests")
 
+    # a doctor asks a patient once, create_doctor_request checks this pair
+    __table_args__ = (
+        Index("uq_doctor_requests_patient_id_doctor_id", "patient_id", "doctor_id", unique=True),
+        Index("ix_doctor_requests_doctor_id", "doctor_id"),
+    )
+
 class PatientRequest(Base):
     __tablename__ = "patient_requests"
 
@@ -130,6 +202,12 @@ class PatientRequest(Base):
     doctor = relationship("Doctor", back_populates="patient_requests")
     patient = relationship("Patient", back_populates="patient_requests")
 
+    # a patient asks a doctor once, create_patient_request checks this pair
+    __table_args__ = (
+        Index("uq_patient_requests_doctor_id_patient_id", "doctor_id", "patient_id", unique=True),
+        Index("ix_patient_requests_patient_id", "patient_id"),
+    )
+
 class Question(Base):
     __tablename__ = "questions"
 
@@ -138,7 +216,7 @@ class Question(Base):
     description = Column(String, nullable=False)
     creation_date = Column(TIMESTAMP(timezone=True),
                         nullable=False, server_default=text('now()'))
-    patient_id = Column(Integer, ForeignKey('patients.id'))
+    patient_id = Column(Integer, ForeignKey('patients.id'), index=True)
     patient = relationship("Patient")
 
 class Answer(Base):
@@ -148,7 +226,7 @@ class Answer(Base):
     content = Column(String, nullable=False)
     creation_date = Column(TIMESTAMP(timezone=True),
                         nullable=False, server_default=text('now()'))
-    question_id = Column(Integer, ForeignKey('questions.id'))
+    question_id = Column(Integer, ForeignKey('questions.id'), index=True)
     llm_id = Column(Integer, ForeignKey('language_models.id'))
     question = relationship("Question")
     language_model = relationship("LanguageModel")
@@ -160,8 +238,8 @@ class Comment(Base):
     content = Column(String, nullable=False)
     creation_date = Column(TIMESTAMP(timezone=True),
                         nullable=False, server_default=text('now()'))
-    question_id = Column(Integer, ForeignKey('questions.id'), nullable=True)
-    answer_id = Column(Integer, ForeignKey('answers.id'), nullable=True)
+    question_id = Column(Integer, ForeignKey('questions.id'), nullable=True, index=True)
+    answer_id = Column(Integer, ForeignKey('answers.id'), nullable=True, index=True)
     doctor_id = Column(Integer, ForeignKey('doctors.id'), nullable=True)
     doctor = relationship("Doctor")
     question = relationship("Question")
@@ -1,9 +1,14 @@
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
-from . import schemas, database, models
+import hashlib
+import hmac
+import secrets
+import time
+from . import schemas, database, models, cache, metrics
 from fastapi import Depends, status, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .config import settings
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl='login')
@@ -16,6 +21,14 @@ SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 
+# user principals by user id, so authenticated requests don't look the user up
+user_cache = cache.create_cache(
+    "users", max_size=settings.user_cache_max_size, ttl=settings.user_cache_ttl_seconds)
+
+# verified TokenData by token digest, each entry lives until the token's exp so
+# a bearer token's signature is checked once per worker instead of per request
+token_cache = cache.TTLCache(max_size=settings.token_cache_max_size, ttl=None)
+
 
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -28,27 +41,100 @@ def create_access_token(data: dict):
     return encoded_jwt
 
 
+def claim_columns(user_id):
+    """The columns access_token_data needs, to select alongside the users row."""
+    return (
+        models.User.user_type,
+        models.User.is_superuser,
+        select(models.Doctor.id).where(models.Doctor.user_id == user_id).limit(1).scalar_subquery().label("doctor_id"),
+        select(models.Patient.id).where(models.Patient.user_id == user_id).limit(1).scalar_subquery().label("patient_id"),
+    )
+
+
+def access_token_data(user_id: int, row):
+    # claims are only as fresh as the token, a role change shows up at the
+    # next /refresh (which re-reads them) or login; see README
+    return {
+        "user_id": user_id,
+        "user_type": row.user_type.value if row.user_type is not None else None,
+        "is_superuser": row.is_superuser,
+        "doctor_id": row.doctor_id,
+        "patient_id": row.patient_id,
+    }
+
+
+def create_refresh_token():
+    """Opaque random token for the client and the HMAC the database stores for it."""
+    token = secrets.token_urlsafe(32)
+    return token, hash_refresh_token(token)
+
+
+def hash_refresh_token(token: str):
+    # a keyed hash, a leaked refresh_tokens table can't be replayed without SECRET_KEY
+    return hmac.new(SECRET_KEY.encode(), token.encode(), hashlib.sha256).hexdigest()
+
+
 def verify_access_token(token: str, credentials_exception):
 
+    token_key = hashlib.sha256(token.encode()).hexdigest()
+    token_data = token_cache.get(token_key)
+    if token_data is not None:
+        return token_data
+
     try:
 
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         id: str = payload.get("user_id")
         if id is None:
             raise credentials_exception
-        token_data = schemas.TokenData(id=id)
+        token_data = schemas.TokenData(
+            id=id, user_type=payload.get("user_type"), is_superuser=payload.get("is_superuser", False),
+            doctor_id=payload.get("doctor_id"), patient_id=payload.get("patient_id"))
     except JWTError:
         raise credentials_exception
 
+    expire = payload.get("exp")
+    if expire is not None:
+        token_cache.set(token_key, token_data, ttl=expire - time.time())
+
     return token_data
 
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+def get_current_claims(token: str = Depends(oauth2_scheme)):
+    """The verified token claims, for dependencies that authorize without a database."""
     credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
-                                          detail=f"Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
+                                          detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
+    with metrics.timed("auth"):
+        return verify_access_token(token, credentials_exception)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(database.get_async_db)):
+    credentials_exception = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                                          detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"})
+
+    with metrics.timed("auth"):
+        token = verify_access_token(token, credentials_exception)
+
+        cached_user = await user_cache.get_async(token.id)
+        if cached_user is not None:
+            return schemas.UserPrincipal(**cached_user)
+
+        user = (await db.execute(select(models.User).filter(models.User.id == int(token.id)))).scalars().first()
+        if user is None:
+            return user
+
+        principal = schemas.UserPrincipal.from_orm(user)
+        await user_cache.set_async(token.id, principal.dict())
+
+        return principal
+
 
-    token = verify_access_token(token, credentials_exception)
+def invalidate_user(user_id: int):
+    user_cache.delete(str(user_id))
 
-    user = db.query(models.User).filter(models.User.id == token.id).first()
 
-    return user
+# any ORM flush that changes or removes a user drops its cached principal
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _invalidate_cached_user(mapper, connection, target):
+    invalidate_user(target.id)
@@ -0,0 +1,122 @@
+import hashlib
+import time
+from typing import Any, Optional
+
+import orjson
+from fastapi import Request, Response
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel, parse_obj_as
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import cache, metrics, schemas
+from .config import settings
+
+
+def _default(obj):
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+class ORJSONResponse(JSONResponse):
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        with metrics.timed("serialization"):
+            return orjson.dumps(content, default=_default)
+
+
+def model_response(response_model, content, status_code: int = 200, headers: Optional[dict] = None):
+    """Validate content against response_model and render it with orjson.
+
+    Returning a Response makes FastAPI skip its own response_model handling, so the
+    validated models are dumped directly instead of going through a recursive
+    jsonable_encoder pass first. Keep response_model on the route for the docs.
+    """
+    with metrics.timed("serialization"):
+        return ORJSONResponse(parse_obj_as(response_model, content), status_code=status_code, headers=headers)
+
+
+async def _stream_rows(db: AsyncSession, statement, response_model, format, chunk_size: int, scalars: bool):
+    result = await db.stream(statement.execution_options(yield_per=chunk_size))
+    if scalars:
+        result = result.scalars()
+    separator = b"\n" if format == schemas.StreamFormat.NDJSON else b","
+    first = True
+    if format == schemas.StreamFormat.JSON:
+        yield b"["
+    async for rows in result.partitions():
+        with metrics.timed("serialization"):
+            chunk = separator.join(orjson.dumps(parse_obj_as(response_model, row), default=_default) for row in rows)
+        if format == schemas.StreamFormat.NDJSON:
+            yield chunk + b"\n"
+        else:
+            yield chunk if first else b"," + chunk
+        first = False
+    if format == schemas.StreamFormat.JSON:
+        yield b"]"
+
+
+def stream_response(db: AsyncSession, statement, response_model, format, chunk_size: int, scalars: bool = False):
+    """Serialize the rows of statement as they come off a server side cursor.
+
+    Memory stays at one chunk of rows whatever the limit, format is an
+    NDJSON line per row or one JSON array sent in pieces. scalars unwraps
+    single entity rows, like .scalars() on a regular result.
+    """
+    media_type = "application/x-ndjson" if format == schemas.StreamFormat.NDJSON else ORJSONResponse.media_type
+    return StreamingResponse(_stream_rows(db, statement, response_model, format, chunk_size, scalars), media_type=media_type)
+
+
+class ResponseCache:
+    """Rendered JSON bodies keyed by namespace, route, query params and user scope.
+
+    Every namespace carries a generation that is part of the key, invalidate()
+    moves it to a new value so all of the namespace's entries are dropped at
+    once, on the local and on the shared backend alike.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    async def key(self, namespace: str, request: Request, scope: str = "public"):
+        generation = await self.backend.get_async(f"generation:{namespace}", "0")
+        params = "&".join(f"{name}={value}" for name, value in sorted(request.query_params.multi_items()))
+        return f"{namespace}:{generation}:{scope}:{request.url.path}?{params}"
+
+    async def invalidate(self, namespace: str):
+        # time_ns never hands out a generation twice, even after the
+        # generation entry itself has expired
+        await self.backend.set_async(f"generation:{namespace}", str(time.time_ns()))
+
+    async def get(self, key: str, request: Request):
+        entry = await self.backend.get_async(key)
+        if entry is None:
+            return None
+        return self._respond(entry["body"].encode(), entry["etag"], request)
+
+    async def store(self, key: str, response: Response, request: Request):
+        etag = '"' + hashlib.sha1(response.body).hexdigest() + '"'
+        await self.backend.set_async(key, {"body": response.body.decode(), "etag": etag})
+        return self._respond(response.body, etag, request)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
+
+    def _respond(self, body: bytes, etag: str, request: Request):
+        if etag in request.headers.get("if-none-match", ""):
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type=ORJSONResponse.media_type, headers={"ETag": etag})
+
+
+def response_cache_ttl():
+    if settings.cache_url:
+        return settings.response_cache_ttl_seconds
+    return min(settings.response_cache_ttl_seconds, settings.response_cache_local_ttl_seconds)
+
+
+response_cache = ResponseCache(cache.create_cache(
+    "responses", max_size=settings.response_cache_max_size, ttl=response_cache_ttl()))
@@ -1,30 +1,102 @@
+import uuid
+from datetime import datetime, timedelta, timezone
+
 from fastapi import APIRouter, Depends, status, HTTPException, Response
 from fastapi.security.oauth2 import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
 
 from .. import database, schemas, models, utils, oauth2
+from ..config import settings
 
 router = APIRouter(tags=['Authentication'])
 
 # the information that is returned should be compliant with schemas.Token
 # the information that serves as the input should be compliant with OAuth2PasswordRequestForm
 @router.post('/login', response_model=schemas.Token)
-def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
+async def login(user_credentials: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_async_db)):
 
-    user = db.query(models.User).filter(
-        models.User.email == user_credentials.username).first()
+    row = (await db.execute(select(models.User, *oauth2.claim_columns(models.User.id)).filter(
+        models.User.email == user_credentials.username))).first()
 
-    if not user:
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail=f"Invalid Credentials")
+    user = row.User
 
-    if not utils.verify(user_credentials.password, user.password):
+    verified, new_hash = await utils.verify_and_update_async(user_credentials.password, user.password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, detail=f"Invalid Credentials")
 
+    # the hash was made with a different work factor than the configured one
+    if new_hash:
+        user.password = new_hash
+        await db.commit()
+
     # create a token
     # return token
 
-    access_token = oauth2.create_access_token(data={"user_id": user.id})
+    access_token = oauth2.create_access_token(data=oauth2.access_token_data(user.id, row))
+    refresh_token = await issue_refresh_token(db, user.id, uuid.uuid4().hex)
+    await db.commit()
+
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+async def issue_refresh_token(db: AsyncSession, user_id: int, family_id: str):
+    refresh_token, token_hash = oauth2.create_refresh_token()
+    await db.execute(insert(models.RefreshToken).values(
+        user_id=user_id, token_hash=token_hash, family_id=family_id,
+        expires_at=datetime.now(timezone.utc) + timedelta(days=settings.refresh_token_expire_days)))
+    return refresh_token
+
+
+async def revoke_family(db: AsyncSession, token_hash: str):
+    presented = aliased(models.RefreshToken)
+    family = select(presented.family_id).where(presented.token_hash == token_hash).scalar_subquery()
+    await db.execute(update(models.RefreshToken).where(
+        models.RefreshToken.family_id == family, models.RefreshToken.revoked_at.is_(None)).values(
+        revoked_at=func.now()).execution_options(synchronize_session=False))
+
+
+# renewing costs an HMAC and one UPDATE on the token_hash index instead of a
+# bcrypt verify. The UPDATE both checks and consumes the token, so two
+# concurrent refreshes with the same token can't both succeed
+@router.post('/refresh', response_model=schemas.Token)
+async def refresh(request: schemas.RefreshRequest, db: AsyncSession = Depends(database.get_async_db)):
+    token_hash = oauth2.hash_refresh_token(request.refresh_token)
+
+    # the claims for the new access token come back from the same statement
+    used = (await db.execute(update(models.RefreshToken).where(
+        models.RefreshToken.token_hash == token_hash,
+        models.RefreshToken.revoked_at.is_(None),
+        models.RefreshToken.expires_at > func.now(),
+        models.RefreshToken.user_id == models.User.id).values(revoked_at=func.now()).returning(
+        models.RefreshToken.user_id, models.RefreshToken.family_id,
+        *oauth2.claim_columns(models.RefreshToken.user_id)).execution_options(
+        synchronize_session=False))).first()
+
+    if not used:
+        # a rotated out token coming back means it was stolen (or the client
+        # is broken), either way nothing issued from that login is trusted
+        await revoke_family(db, token_hash)
+        await db.commit()
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED,
+                            detail="Invalid refresh token", headers={"WWW-Authenticate": "Bearer"})
+
+    refresh_token = await issue_refresh_token(db, used.user_id, used.family_id)
+    await db.commit()
+
+    access_token = oauth2.create_access_token(data=oauth2.access_token_data(used.user_id, used))
+
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
+
+@router.post('/logout', status_code=status.HTTP_204_NO_CONTENT)
+async def logout(request: schemas.RefreshRequest, db: AsyncSession = Depends(database.get_async_db)):
+    await revoke_family(db, oauth2.hash_refresh_token(request.refresh_token))
+    await db.commit()
 
-    return {"access_token": access_token, "token_type": "bearer"}
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
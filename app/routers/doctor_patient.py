@@ -6,32 +6,33 @@ from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.orm import Session
 
 from .. import models, schemas, database, oauth2
 
 router = APIRouter(tags=['DoctorPatient'])
 
-async def get_current_doctor_or_superuser(current_user: schemas.UserCreate = Depends(oauth2.get_current_user)):
-    if current_user.user_type not in ["DOCTOR", "SUPERUSER"]:
+# role checks read the verified token claims only, no user row is loaded
+async def get_current_doctor_or_superuser(claims: schemas.TokenData = Depends(oauth2.get_current_claims)):
+    if claims.user_type != models.UserType.DOCTOR and not claims.is_superuser:
         raise HTTPException(
             status_code=400, detail="The user does not have the right privileges"
         )
-    return current_user
+    return claims
 
-async def get_current_patient_or_superuser(current_user: schemas.UserCreate = Depends(oauth2.get_current_user)):
-    if current_user.user_type not in ["PATIENT", "SUPERUSER"]:
+async def get_current_patient_or_superuser(claims: schemas.TokenData = Depends(oauth2.get_current_claims)):
+    if claims.user_type != models.UserType.PATIENT and not claims.is_superuser:
         raise HTTPException(
             status_code=400, detail="The user does not have the right privileges"
         )
-    return current_user
+    return claims
 
 @router.post('/doctor_requests/', status_code=status.HTTP_201_CREATED)
 def create_doctor_request(patient_id: int, db: Session = Depends(database.get_db),
-                          current_user: schemas.UserCreate = Depends(get_current_doctor_or_superuser)):
+                          current_user: schemas.TokenData = Depends(get_current_doctor_or_superuser)):
     # Ensuring that the current user is a doctor
-    doctor = db.query(models.Doctor).filter(models.Doctor.user_id == current_user.id).first()
-    if not doctor:
+    if current_user.doctor_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User is not a doctor"
@@ -43,55 +44,46 @@ def create_doctor_request(patient_id: int, db: Session = Depends(database.get_db
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
         )
-    # Check if doctor already requested this patient
-    doctor_request = db.query(models.DoctorRequest).filter(
-        models.DoctorRequest.patient_id == patient_id,
-        models.DoctorRequest.doctor_id == doctor.id,
-    ).first()
+    # Create the doctor's request, the unique (patient_id, doctor_id) index
+    # turns a repeated or concurrent one into no row
+    doctor_request = db.execute(insert(models.DoctorRequest).values(
+        doctor_id=current_user.doctor_id, patient_id=patient_id, status=models.RequestStatus.PENDING
+    ).on_conflict_do_nothing(index_elements=["patient_id", "doctor_id"]).returning(models.DoctorRequest.id)).first()
 
-    if doctor_request:
+    if not doctor_request:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Doctor has already sent a request to this patient"
         )
-
-    # Create the doctor's request
-    doctor_request = models.DoctorRequest(doctor_id=doctor.id, patient_id=patient_id)
-    db.add(doctor_request)
     db.commit()
 
     return {"detail": "Doctor's request to Patient has been created successfully"}
 
 @router.post('/patient_requests/', status_code=status.HTTP_201_CREATED)
 def create_patient_request(doctor_id: int, db: Session = Depends(database.get_db),
-                           current_patient: schemas.UserCreate = Depends(get_current_patient_or_superuser)):
-    if not current_patient.patient:
+                           current_patient: schemas.TokenData = Depends(get_current_patient_or_superuser)):
+    if current_patient.patient_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Patient not found"
         )
-    # Check if patient already requested this doctor
-    patient_request = db.query(models.PatientRequest).filter(
-        models.PatientRequest.doctor_id == doctor_id,
-        models.PatientRequest.patient_id == current_patient.patient.id,
-    ).first()
+    # Create the patient's request, same as the doctor's above
+    patient_request = db.execute(insert(models.PatientRequest).values(
+        doctor_id=doctor_id, patient_id=current_patient.patient_id, status=models.RequestStatus.PENDING
+    ).on_conflict_do_nothing(index_elements=["doctor_id", "patient_id"]).returning(models.PatientRequest.id)).first()
 
-    if patient_request:
+    if not patient_request:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Patient has already sent a request to this doctor"
         )
-
-    # Create the patient's request
-    patient_request = models.PatientRequest(doctor_id=doctor_id, patient_id=current_patient.patient.id)
-    db.add(patient_request)
     db.commit()
 
     return {"detail": "Patient's request to Doctor has been created successfully"}
 
 @router.post('/doctor_patient/', status_code=status.HTTP_201_CREATED)
 def create_doctor_patient(patient_id: int, doctor_id: int, db: Session = Depends(database.get_db),
-                          current_doctor: schemas.UserCreate = Depends(get_current_doctor_or_superuser)):
+                          current_doctor: schemas.TokenData = Depends(get_current_doctor_or_superuser)):
     # Check doctor_request table for acceptance status
     doctor_request = db.query(models.DoctorRequest).filter(
         models.DoctorRequest.patient_id == patient_id,
@@ -0,0 +1,48 @@
+import os
+
+from fastapi import APIRouter, Depends, HTTPException, status
+
+from .. import database, oauth2, responses, schemas, trending
+
+router = APIRouter(
+    prefix="/health",
+    tags=['Health']
+)
+
+
+# pools live per worker process, so every response carries the pid it was
+# served by; poll repeatedly to sample each gunicorn worker
+@router.get("/pool")
+def pool_status():
+    return {"pid": os.getpid(), "pools": database.engine_pool_status()}
+
+
+async def get_current_superuser(claims: schemas.TokenData = Depends(oauth2.get_current_claims)):
+    if not claims.is_superuser:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not enough permissions")
+    return claims
+
+
+# entries carry raw bound parameters (emails, password hashes, token digests)
+@router.get("/slow-queries", dependencies=[Depends(get_current_superuser)])
+def slow_queries():
+    if database.slow_query_log is None:
+        return {"pid": os.getpid(), "enabled": False}
+    return {"pid": os.getpid(), "enabled": True, **database.slow_query_log.stats()}
+
+
+@router.get("/trending")
+def trending_status():
+    return {"pid": os.getpid(), **trending.refresher.stats()}
+
+
+@router.get("/caches")
+def cache_stats():
+    return {
+        "pid": os.getpid(),
+        "caches": {
+            "users": oauth2.user_cache.stats(),
+            "tokens": oauth2.token_cache.stats(),
+            "responses": responses.response_cache.stats(),
+        },
+    }
@@ -1,8 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Security
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Security
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import models, schemas, database, oauth2
-from ..database import get_db
-from typing import List
+from ..database import get_async_db, get_read_db
+from ..responses import model_response, response_cache, stream_response
+from ..config import settings
+from typing import List, Optional
 
 router = APIRouter(
     prefix="/language_models",
@@ -11,7 +14,7 @@ router = APIRouter(
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.LanguageModel)
 async def create_language_model(language_model: schemas.LanguageModelCreate,
-                                db: Session = Depends(get_db),
+                                db: AsyncSession = Depends(get_async_db),
                                 current_user: models.User = Depends(oauth2.get_current_user)):
     if not current_user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -21,15 +24,28 @@ async def create_language_model(language_model: schemas.LanguageModelCreate,
 
     new_language_model = models.LanguageModel(**language_model.dict())
     db.add(new_language_model)
-    db.commit()
-    db.refresh(new_language_model)
+    await db.commit()
+    await db.refresh(new_language_model)
+    await response_cache.invalidate("language_models")
 
     return new_language_model
 
 @router.get("/", response_model=List[schemas.LanguageModel])
-async def read_all_language_models(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    language_models = db.query(models.LanguageModel).offset(skip).limit(limit).all()
-    return language_models
+async def read_all_language_models(request: Request, skip: int = 0, limit: int = 100, stream: Optional[schemas.StreamFormat] = None,
+                                   db: AsyncSession = Depends(get_read_db),
+                                   primary_db: AsyncSession = Depends(get_async_db)):
+    if stream:
+        return stream_response(db, select(models.LanguageModel).offset(skip).limit(limit),
+                               schemas.LanguageModel, stream, settings.stream_chunk_size, scalars=True)
+
+    cache_key = await response_cache.key("language_models", request)
+    cached = await response_cache.get(cache_key, request)
+    if cached is not None:
+        return cached
+
+    # cache fills read from the primary, like get_post
+    language_models = (await primary_db.execute(select(models.LanguageModel).offset(skip).limit(limit))).scalars().all()
+    return await response_cache.store(cache_key, model_response(List[schemas.LanguageModel], language_models), request)
 
 # from fastapi import APIRouter, Depends, HTTPException, status, Security
 # from fastapi.security import OAuth2PasswordBearer
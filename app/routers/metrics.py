@@ -0,0 +1,15 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from .. import metrics
+
+router = APIRouter(
+    tags=['Metrics']
+)
+
+
+# like /health/pool the numbers are per worker process, scrape each worker
+# (or run a single worker per container) to get the full picture
+@router.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render_latest(), media_type="text/plain; version=0.0.4")
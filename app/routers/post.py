@@ -1,11 +1,16 @@
-from fastapi import FastAPI, Response, status, HTTPException, Depends, APIRouter
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Query, Request, Response, status, HTTPException, Depends, APIRouter
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from datetime import datetime, timezone
 from typing import List, Optional
 
-from sqlalchemy import func
+from sqlalchemy import cast, delete, func, literal_column, select, tuple_, update
 # from sqlalchemy.sql.functions import func
-from .. import models, schemas, oauth2
-from ..database import get_db
+from .. import bulk, models, schemas, oauth2, utils
+from ..config import settings
+from ..responses import model_response, response_cache, stream_response
+from ..database import get_async_db, get_read_db
 
 
 router = APIRouter(
@@ -16,7 +21,7 @@ router = APIRouter(
 
 # @router.get("/", response_model=List[schemas.Post])
 @router.get("/", response_model=List[schemas.PostOut])
-def get_posts(db: Session = Depends(get_db), current_user: int = Depends(oauth2.get_current_user), limit: int = 10, skip: int = 0, search: Optional[str] = ""):
+async def get_posts(db: AsyncSession = Depends(get_read_db), current_user: int = Depends(oauth2.get_current_user), limit: int = 10, skip: int = 0, search: Optional[str] = "", search_mode: schemas.SearchMode = schemas.SearchMode.CONTAINS, cursor: Optional[str] = None, stream: Optional[schemas.StreamFormat] = None):
     # results = db.query(models.Post, func.count(models.Vote.post_id).label("votes")).join(
     #     models.Vote, models.Vote.post_id == models.Post.id, isouter=True).group_by(models.Post.id)
 
@@ -32,13 +37,59 @@ def get_posts(db: Session = Depends(get_db), current_user: int = Depends(oauth2.
     # posts = db.query(models.Post).filter(
     #     models.Post.title.contains(search)).limit(limit).offset(skip).all()
 
-    posts = db.query(models.Post, func.count(models.Vote.post_id).label("votes")).join(
-        models.Vote, models.Vote.post_id == models.Post.id, isouter=True).group_by(models.Post.id).filter(models.Post.title.contains(search)).limit(limit).offset(skip).all()
-    return posts
+    # owners are joined in, loading them lazily would be one more query per
+    # post (and can't be awaited from inside response serialization anyway)
+    posts_query = select(models.Post, models.Post.vote_count.label("votes")).options(
+        joinedload(models.Post.owner))
+
+    if search and search_mode == schemas.SearchMode.FULLTEXT:
+        # ranked matches served by the ix_posts_search_vector GIN index
+        if cursor:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="cursor pagination is not supported for fulltext search")
+        ts_query = func.websearch_to_tsquery(literal_column("'english'"), search)
+        posts_query = posts_query.filter(models.Post.search_vector.op('@@')(ts_query)).order_by(
+            func.ts_rank(models.Post.search_vector, ts_query).desc(), models.Post.id.desc())
+        posts_query = posts_query.limit(limit).offset(skip)
+        if stream:
+            return stream_response(db, posts_query, schemas.PostOut, stream, settings.stream_chunk_size)
+        posts = (await db.execute(posts_query)).all()
+        return model_response(List[schemas.PostOut], posts)
+
+    posts_query = posts_query.filter(models.Post.title.contains(search)).order_by(
+        models.Post.created_at.desc(), models.Post.id.desc())
+
+    # keyset pagination: seek past the last row of the previous page through
+    # ix_posts_created_at_id instead of scanning and discarding `skip` rows
+    if cursor:
+        try:
+            created_at, post_id = utils.decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                detail="Invalid cursor")
+        posts_query = posts_query.filter(tuple_(models.Post.created_at, models.Post.id) < tuple_(
+            cast(created_at, models.Post.created_at.type), cast(post_id, models.Post.id.type)))
+    else:
+        posts_query = posts_query.offset(skip)
+
+    # streamed pages start sending before the last row is known, so they
+    # don't carry X-Next-Cursor
+    if stream:
+        return stream_response(db, posts_query.limit(limit), schemas.PostOut, stream, settings.stream_chunk_size)
+
+    posts = (await db.execute(posts_query.limit(limit))).all()
+
+    headers = {}
+    if posts and len(posts) == limit:
+        last_post = posts[-1].Post
+        headers["X-Next-Cursor"] = utils.encode_cursor(
+            last_post.created_at, last_post.id)
+
+    return model_response(List[schemas.PostOut], posts, headers=headers)
 
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.Post)
-def create_posts(post: schemas.PostCreate, db: Session = Depends(get_db), current_user: int = Depends(oauth2.get_current_user)):
+async def create_posts(post: schemas.PostCreate, db: AsyncSession = Depends(get_async_db), current_user: int = Depends(oauth2.get_current_user)):
     # cursor.execute("""INSERT INTO posts (title, content, published) VALUES (%s, %s, %s) RETURNING * """,
     #                (post.title, post.content, post.published))
     # new_post = cursor.fetchone()
@@ -47,55 +98,120 @@ def create_posts(post: schemas.PostCreate, db: Session = Depends(get_db), curren
 
     new_post = models.Post(owner_id=current_user.id, **post.dict())
     db.add(new_post)
-    db.commit()
-    db.refresh(new_post)
+    await db.commit()
+    await db.refresh(new_post)
 
-    return new_post
+    # the owner is the caller, no need to load it back from the database
+    return {**post.dict(), "id": new_post.id, "created_at": new_post.created_at,
+            "owner_id": current_user.id, "owner": current_user}
+
+
+@router.post("/import")
+async def import_posts(request: Request, format: schemas.BulkFormat = Query(schemas.BulkFormat.NDJSON),
+                       db: AsyncSession = Depends(get_async_db), current_user: int = Depends(oauth2.get_current_user)):
+    # the body is read as it arrives, an import of any size holds one chunk
+    # of rows in memory; everything commits together or not at all
+    result = await bulk.import_posts(db, request.stream(), format, current_user.id,
+                                     chunk_size=settings.post_import_chunk_size,
+                                     max_errors=settings.post_import_max_errors)
+    await db.commit()
+
+    return result
+
+
+# declared before /{id} like /export below
+@router.get("/trending", response_model=List[schemas.PostOut])
+async def get_trending_posts(db: AsyncSession = Depends(get_read_db), current_user: int = Depends(oauth2.get_current_user), limit: int = 10, skip: int = 0):
+    # precomputed by app/trending.py, so this walks ix_post_trending_score_post_id
+    # instead of ranking every post per request
+    posts = (await db.execute(select(models.Post, models.Post.vote_count.label("votes"),
+                                     models.PostTrending.refreshed_at).join(
+        models.PostTrending, models.PostTrending.post_id == models.Post.id).options(
+        joinedload(models.Post.owner)).order_by(
+        models.PostTrending.score.desc(), models.PostTrending.post_id.desc()).limit(limit).offset(skip))).all()
+
+    headers = {}
+    if posts:
+        refreshed_at = max(post.refreshed_at for post in posts)
+        headers["X-Trending-Refreshed-At"] = refreshed_at.isoformat()
+        headers["X-Trending-Age-Seconds"] = str(int((datetime.now(timezone.utc) - refreshed_at).total_seconds()))
+
+    return model_response(List[schemas.PostOut], posts, headers=headers)
+
+
+# declared before /{id} so "export" isn't parsed as a post id
+@router.get("/export")
+async def export_posts(format: schemas.BulkFormat = Query(schemas.BulkFormat.NDJSON),
+                       db: AsyncSession = Depends(get_read_db), current_user: int = Depends(oauth2.get_current_user)):
+    media_type = "text/csv" if format == schemas.BulkFormat.CSV else "application/x-ndjson"
+    return StreamingResponse(bulk.export_posts(db, current_user.id, format, settings.post_export_chunk_size),
+                             media_type=media_type)
 
 
 @router.get("/{id}", response_model=schemas.PostOut)
-def get_post(id: int, db: Session = Depends(get_db), current_user: int = Depends(oauth2.get_current_user)):
+async def get_post(id: int, request: Request, db: AsyncSession = Depends(get_async_db), current_user: int = Depends(oauth2.get_current_user)):
     # cursor.execute("""SELECT * from posts WHERE id = %s """, (str(id),))
     # post = cursor.fetchone()
     # post = db.query(models.Post).filter(models.Post.id == id).first()
 
-    post = db.query(models.Post, func.count(models.Vote.post_id).label("votes")).join(
-        models.Vote, models.Vote.post_id == models.Post.id, isouter=True).group_by(models.Post.id).filter(models.Post.id == id).first()
+    # every authenticated user sees the same post, so they share one entry.
+    # misses read from the primary, a lagging replica could refill the entry
+    # a write just invalidated and serve it stale for the whole TTL
+    cache_key = await response_cache.key(f"post:{id}", request, scope="authenticated")
+    cached = await response_cache.get(cache_key, request)
+    if cached is not None:
+        return cached
+
+    post = (await db.execute(select(models.Post, models.Post.vote_count.label("votes")).options(
+        joinedload(models.Post.owner)).filter(models.Post.id == id))).first()
 
     if not post:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"post with id: {id} was not found")
 
-    return post
+    return await response_cache.store(cache_key, model_response(schemas.PostOut, post), request)
+
+
+# what RETURNING hands back for schemas.Post, search_vector stays in the database
+post_columns = (models.Post.id, models.Post.title, models.Post.content, models.Post.published,
+                models.Post.created_at, models.Post.owner_id)
+
+
+async def raise_post_write_error(db: AsyncSession, id: int):
+    # only reached when the conditional write matched nothing, one more
+    # lookup tells a missing post from somebody else's
+    owner_id = (await db.execute(select(models.Post.owner_id).where(models.Post.id == id))).scalar()
+
+    if owner_id is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                            detail=f"post with id: {id} does not exist")
+
+    raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
+                        detail="Not authorized to perform requested action")
 
 
 @router.delete("/{id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_post(id: int, db: Session = Depends(get_db), current_user: int = Depends(oauth2.get_current_user)):
+async def delete_post(id: int, db: AsyncSession = Depends(get_async_db), current_user: int = Depends(oauth2.get_current_user)):
 
     # cursor.execute(
     #     """DELETE FROM posts WHERE id = %s returning *""", (str(id),))
     # deleted_post = cursor.fetchone()
     # conn.commit()
-    post_query = db.query(models.Post).filter(models.Post.id == id)
-
-    post = post_query.first()
-
-    if post == None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"post with id: {id} does not exist")
+    deleted = (await db.execute(delete(models.Post).where(
+        models.Post.id == id, models.Post.owner_id == current_user.id).returning(models.Post.id).execution_options(
+        synchronize_session=False))).first()
 
-    if post.owner_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail="Not authorized to perform requested action")
+    if not deleted:
+        await raise_post_write_error(db, id)
 
-    post_query.delete(synchronize_session=False)
-    db.commit()
+    await db.commit()
+    await response_cache.invalidate(f"post:{id}")
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.put("/{id}", response_model=schemas.Post)
-def update_post(id: int, updated_post: schemas.PostCreate, db: Session = Depends(get_db), current_user: int = Depends(oauth2.get_current_user)):
+async def update_post(id: int, updated_post: schemas.PostCreate, db: AsyncSession = Depends(get_async_db), current_user: int = Depends(oauth2.get_current_user)):
 
     # cursor.execute("""UPDATE posts SET title = %s, content = %s, published = %s WHERE id = %s RETURNING *""",
     #                (post.title, post.content, post.published, str(id)))
@@ -103,20 +219,15 @@ def update_post(id: int, updated_post: schemas.PostCreate, db: Session = Depends
     # updated_post = cursor.fetchone()
     # conn.commit()
 
-    post_query = db.query(models.Post).filter(models.Post.id == id)
-
-    post = post_query.first()
+    post = (await db.execute(update(models.Post).where(
+        models.Post.id == id, models.Post.owner_id == current_user.id).values(
+        **updated_post.dict()).returning(*post_columns).execution_options(synchronize_session=False))).first()
 
-    if post == None:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"post with id: {id} does not exist")
-
-    if post.owner_id != current_user.id:
-        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN,
-                            detail="Not authorized to perform requested action")
-
-    post_query.update(updated_post.dict(), synchronize_session=False)
+    if not post:
+        await raise_post_write_error(db, id)
 
-    db.commit()
+    await db.commit()
+    await response_cache.invalidate(f"post:{id}")
 
-    return post_query.first()
+    # the owner is the current user, no need to load it again
+    return {**post._mapping, "owner": current_user}
@@ -1,8 +1,9 @@
 from fastapi import FastAPI, Response, status, HTTPException, Depends, APIRouter
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from .. import models, schemas, utils
 from ..schemas import UserType
-from ..database import get_db
+from ..database import get_async_db, get_read_db
 
 router = APIRouter(
     prefix="/users",
@@ -13,24 +14,24 @@ router = APIRouter(
 
 ### ------------------ Posts ------------------ ###
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=schemas.UserOut)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
 
     # hash the password - user.password
-    hashed_password = utils.hash(user.password)
+    hashed_password = await utils.hash_async(user.password)
     user.password = hashed_password
 
     new_user = models.User(**user.dict())
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return new_user
 
 
 @router.post("/doctors", status_code=status.HTTP_201_CREATED, response_model=schemas.DoctorOut)
-def create_doctor(doctor: schemas.DoctorCreate, db: Session = Depends(get_db)):
+async def create_doctor(doctor: schemas.DoctorCreate, db: AsyncSession = Depends(get_async_db)):
 
-    user = db.query(models.User).filter(models.User.id == doctor.user_id).first()
+    user = (await db.execute(select(models.User).filter(models.User.id == doctor.user_id))).scalars().first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"User with id: {doctor.user_id} does not exist")
@@ -42,8 +43,8 @@ def create_doctor(doctor: schemas.DoctorCreate, db: Session = Depends(get_db)):
     new_doctor = models.Doctor(**doctor.dict())
     try: 
         db.add(new_doctor)
-        db.commit()
-        db.refresh(new_doctor)
+        await db.commit()
+        await db.refresh(new_doctor)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -51,8 +52,8 @@ def create_doctor(doctor: schemas.DoctorCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/patients", status_code=status.HTTP_201_CREATED, response_model=schemas.PatientOut)
-def create_patient(patient: schemas.PatientCreate, db: Session = Depends(get_db)):
-    user = db.query(models.User).filter(models.User.id == patient.user_id).first()
+async def create_patient(patient: schemas.PatientCreate, db: AsyncSession = Depends(get_async_db)):
+    user = (await db.execute(select(models.User).filter(models.User.id == patient.user_id))).scalars().first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"User with id: {patient.user_id} does not exist")
@@ -64,8 +65,8 @@ def create_patient(patient: schemas.PatientCreate, db: Session = Depends(get_db)
     new_patient = models.Patient(**patient.dict())
     try: 
         db.add(new_patient)
-        db.commit()
-        db.refresh(new_patient)
+        await db.commit()
+        await db.refresh(new_patient)
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
@@ -73,8 +74,8 @@ def create_patient(patient: schemas.PatientCreate, db: Session = Depends(get_db)
 
 ### ------------------ Get ------------------ ###
 @router.get('/{id}', response_model=schemas.UserOut)
-def get_user(id: int, db: Session = Depends(get_db), ):
-    user = db.query(models.User).filter(models.User.id == id).first()
+async def get_user(id: int, db: AsyncSession = Depends(get_read_db), ):
+    user = (await db.execute(select(models.User).filter(models.User.id == id))).scalars().first()
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
                             detail=f"User with id: {id} does not exist")
@@ -1,6 +1,12 @@
 from fastapi import FastAPI, Response, status, HTTPException, Depends, APIRouter
-from sqlalchemy.orm import Session
-from .. import schemas, database, models, oauth2
+from sqlalchemy import delete, exists, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List
+from .. import schemas, database, models, oauth2, votes
+from ..responses import response_cache
+from ..config import settings
 
 
 router = APIRouter(
@@ -9,32 +15,66 @@ router = APIRouter(
 )
 
 
-@router.post("/", status_code=status.HTTP_201_CREATED)
-def vote(vote: schemas.Vote, db: Session = Depends(database.get_db), current_user: int = Depends(oauth2.get_current_user)):
+def count_votes(changed_votes, delta: int):
+    # UPDATE the counters of the posts whose vote rows the CTE actually changed,
+    # so the vote and its counter move together in one statement
+    return update(models.Post).where(models.Post.id.in_(select(changed_votes.c.post_id))).values(
+        vote_count=models.Post.vote_count + delta).returning(models.Post.id).execution_options(
+        synchronize_session=False)
+
 
-    post = db.query(models.Post).filter(models.Post.id == vote.post_id).first()
-    if not post:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
-                            detail=f"Post with id: {vote.post_id} does not exist")
+@router.post("/", status_code=status.HTTP_201_CREATED)
+async def vote(vote: schemas.Vote, db: AsyncSession = Depends(database.get_async_db), current_user: int = Depends(oauth2.get_current_user)):
 
-    vote_query = db.query(models.Vote).filter(
-        models.Vote.post_id == vote.post_id, models.Vote.user_id == current_user.id)
+    if settings.vote_coalesce_window_ms > 0:
+        result = await votes.vote_buffer.submit(current_user.id, vote.post_id, vote.dir)
+        if result["status_code"] != status.HTTP_201_CREATED:
+            raise HTTPException(status_code=result["status_code"], detail=result["detail"])
+        return {"message": result["detail"]}
 
-    found_vote = vote_query.first()
+    # the votes.post_id foreign key doubles as the post existence check and
+    # ON CONFLICT absorbs concurrent double clicks, so there's no read before
+    # the write and nothing to race between
     if (vote.dir == 1):
-        if found_vote:
+        new_vote = insert(models.Vote).values(post_id=vote.post_id, user_id=current_user.id).on_conflict_do_nothing(
+        ).returning(models.Vote.post_id).cte("new_vote")
+        try:
+            voted = (await db.execute(count_votes(new_vote, 1))).first()
+        except IntegrityError:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                detail=f"Post with id: {vote.post_id} does not exist")
+        if not voted:
             raise HTTPException(status_code=status.HTTP_409_CONFLICT,
                                 detail=f"user {current_user.id} has alredy voted on post {vote.post_id}")
-        new_vote = models.Vote(post_id=vote.post_id, user_id=current_user.id)
-        db.add(new_vote)
-        db.commit()
+        await db.commit()
+        await response_cache.invalidate(f"post:{vote.post_id}")
         return {"message": "successfully added vote"}
     else:
-        if not found_vote:
+        old_vote = delete(models.Vote).where(
+            models.Vote.post_id == vote.post_id, models.Vote.user_id == current_user.id).returning(
+            models.Vote.post_id).cte("old_vote")
+        unvoted = (await db.execute(count_votes(old_vote, -1))).first()
+        if not unvoted:
+            post_exists = (await db.execute(select(exists().where(models.Post.id == vote.post_id)))).scalar()
+            if not post_exists:
+                raise HTTPException(status_code=status.HTTP_404_NOT_FOUND,
+                                    detail=f"Post with id: {vote.post_id} does not exist")
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND, detail="Vote does not exist")
-
-        vote_query.delete(synchronize_session=False)
-        db.commit()
+        await db.commit()
+        await response_cache.invalidate(f"post:{vote.post_id}")
 
         return {"message": "successfully deleted vote"}
+
+
+@router.post("/batch", response_model=List[schemas.VoteResult])
+async def vote_batch(batch: List[schemas.Vote], db: AsyncSession = Depends(database.get_async_db), current_user: int = Depends(oauth2.get_current_user)):
+    if len(batch) > settings.vote_batch_max_items:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"at most {settings.vote_batch_max_items} votes per batch")
+
+    results = await votes.apply_votes(db, [(current_user.id, vote.post_id, vote.dir) for vote in batch])
+    await db.commit()
+    await votes.invalidate_posts(results)
+
+    return results
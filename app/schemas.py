@@ -15,6 +15,20 @@ class RequestStatus(str, Enum):
     ACCEPTED = "Accepted"
     REJECTED = "Rejected"
 
+class BulkFormat(str, Enum):
+    NDJSON = "ndjson"
+    CSV = "csv"
+
+
+class StreamFormat(str, Enum):
+    NDJSON = "ndjson"
+    JSON = "json"
+
+
+class SearchMode(str, Enum):
+    CONTAINS = "contains"
+    FULLTEXT = "fulltext"
+
 class PostBase(BaseModel):
     title: str
     content: str
@@ -34,6 +48,17 @@ class UserOut(BaseModel):
         orm_mode = True
 
 
+class UserPrincipal(BaseModel):
+    id: int
+    email: EmailStr
+    created_at: datetime
+    user_type: Optional[UserType]
+    is_superuser: bool
+
+    class Config:
+        orm_mode = True
+
+
 class Post(PostBase):
     id: int
     created_at: datetime
@@ -66,16 +91,33 @@ class UserLogin(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 
 class TokenData(BaseModel):
     id: Optional[str] = None
+    # authorization claims, as of when the access token was issued
+    user_type: Optional[UserType] = None
+    is_superuser: bool = False
+    doctor_id: Optional[int] = None
+    patient_id: Optional[int] = None
 
 
 class Vote(BaseModel):
     post_id: int
     dir: conint(le=1)
 
+
+class VoteResult(BaseModel):
+    post_id: int
+    dir: int
+    status_code: int
+    detail: str
+
 ### ------------------ Doctor ------------------ ###
 class DoctorBase(BaseModel):
     user_id: int
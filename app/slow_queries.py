@@ -0,0 +1,143 @@
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from sqlalchemy import event
+
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def _truncate(value, limit: int = 500):
+    text = repr(value)
+    return text if len(text) <= limit else text[:limit] + "..."
+
+
+def _rowcount(cursor) -> Optional[int]:
+    """Rows the statement returned or changed, None when the driver can't tell.
+
+    asyncpg reports -1 for SELECTs but its adapted cursor has every row
+    buffered by the time the statement finished, server side cursors and
+    psycopg2's named ones haven't fetched anything yet.
+    """
+    if cursor.rowcount >= 0:
+        return cursor.rowcount
+    rows = getattr(cursor, "_rows", None)
+    if isinstance(rows, list) and not getattr(cursor, "server_side", False):
+        return len(rows)
+    return None
+
+
+class SlowQueryLog:
+    """Logs statements slower than threshold_ms and samples EXPLAIN plans for them.
+
+    When explain_top_n is set, the slowest SELECTs of every explain_interval
+    seconds are re-run as EXPLAIN (ANALYZE, BUFFERS) on explain_engine (a sync
+    psycopg2 engine) in a background thread, once the next interval sees its
+    first slow statement. Only SELECTs are explained since ANALYZE executes
+    the statement again.
+    """
+
+    def __init__(self, threshold_ms: float, explain_top_n: int = 0, explain_interval: float = 60,
+                 explain_engine=None, history: int = 100):
+        self.threshold = threshold_ms / 1000
+        self.explain_top_n = explain_top_n if explain_engine is not None else 0
+        self.explain_interval = explain_interval
+        self.explain_engine = explain_engine
+        self.recent = deque(maxlen=history)
+        self.plans = deque(maxlen=history)
+        self._candidates = []
+        self._interval_end = time.monotonic() + explain_interval
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._listeners = []
+
+    def instrument(self, engine):
+        def start_timer(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault("slow_query_start", []).append(time.perf_counter())
+
+        def stop_timer(conn, cursor, statement, parameters, context, executemany):
+            duration = time.perf_counter() - conn.info["slow_query_start"].pop()
+            if duration >= self.threshold:
+                self.record(statement, parameters, duration, _rowcount(cursor))
+
+        for name, listener in (("before_cursor_execute", start_timer), ("after_cursor_execute", stop_timer)):
+            event.listen(engine, name, listener)
+            self._listeners.append((engine, name, listener))
+
+    def remove(self):
+        for engine, name, listener in self._listeners:
+            event.remove(engine, name, listener)
+        self._listeners = []
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def record(self, statement: str, parameters, duration: float, rowcount: Optional[int]):
+        entry = {
+            "duration_ms": round(duration * 1000, 3),
+            "route": metrics.current_route.get(),
+            "rowcount": rowcount,
+            "statement": statement,
+            "parameters": _truncate(parameters),
+        }
+        logger.warning("slow query %.1f ms on %s (%s rows): %s parameters=%s", entry["duration_ms"],
+                       entry["route"], "unknown" if rowcount is None else rowcount, statement, entry["parameters"])
+        self.recent.append(entry)
+
+        if not self.explain_top_n or not statement.lstrip().upper().startswith("SELECT"):
+            return
+        with self._lock:
+            now = time.monotonic()
+            if now >= self._interval_end:
+                due, self._candidates = self._candidates, []
+                self._interval_end = now + self.explain_interval
+                self._submit(due)
+            item = (duration, id(entry), entry, parameters)
+            if len(self._candidates) < self.explain_top_n:
+                heapq.heappush(self._candidates, item)
+            else:
+                heapq.heappushpop(self._candidates, item)
+
+    def explain_pending(self, wait: bool = False):
+        """Explain this interval's candidates now instead of waiting for the next one."""
+        with self._lock:
+            due, self._candidates = self._candidates, []
+            future = self._submit(due)
+        if wait and future is not None:
+            future.result()
+
+    def _submit(self, due):
+        if not due:
+            return None
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+        return self._executor.submit(self._explain, sorted(due, reverse=True))
+
+    def _explain(self, due):
+        connection = self.explain_engine.raw_connection()
+        try:
+            for _, _, entry, parameters in due:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute("EXPLAIN (ANALYZE, BUFFERS) " + entry["statement"], parameters)
+                    plan = "\n".join(row[0] for row in cursor.fetchall())
+                except Exception as error:
+                    logger.warning("could not explain slow query: %s", error)
+                    connection.rollback()
+                    continue
+                finally:
+                    cursor.close()
+                connection.rollback()
+                logger.warning("plan for slow query %.1f ms on %s:\n%s", entry["duration_ms"], entry["route"], plan)
+                self.plans.append({**entry, "plan": plan})
+        finally:
+            connection.close()
+
+    def stats(self):
+        return {"threshold_ms": self.threshold * 1000, "recent": list(self.recent), "plans": list(self.plans)}
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from . import database
+from .config import settings
+
+logger = logging.getLogger(__name__)
+
+# any worker may run the refresh, the advisory lock keeps it to one at a time
+REFRESH_LOCK_KEY = 0x7472656E64
+
+# re-ranks every post in the window (scores decay with age, so all of them
+# move) and drops the ones that left it; one statement, one snapshot
+REFRESH_TRENDING = text("""
+WITH ranked AS (
+    SELECT id AS post_id, vote_count,
+           vote_count / power(EXTRACT(EPOCH FROM now() - created_at) / 3600 + 2, :gravity) AS score
+    FROM posts
+    WHERE created_at > now() - make_interval(hours => :window_hours)
+), upserted AS (
+    INSERT INTO post_trending (post_id, score, vote_count, refreshed_at)
+    SELECT post_id, score, vote_count, now() FROM ranked
+    ON CONFLICT (post_id) DO UPDATE
+        SET score = EXCLUDED.score, vote_count = EXCLUDED.vote_count, refreshed_at = EXCLUDED.refreshed_at
+    RETURNING post_id
+), expired AS (
+    DELETE FROM post_trending WHERE post_id NOT IN (SELECT post_id FROM ranked)
+    RETURNING post_id
+)
+SELECT (SELECT count(*) FROM upserted) AS ranked, (SELECT count(*) FROM expired) AS expired
+""")
+
+
+class TrendingRefresher:
+    """Keeps the post_trending summary table current from a background task.
+
+    Started on app startup when interval_seconds > 0. Every worker runs one,
+    whichever gets the advisory lock first does the refresh of that round.
+    """
+
+    def __init__(self, session_factory, interval_seconds: float, window_hours: int, gravity: float):
+        self.session_factory = session_factory
+        self.interval_seconds = interval_seconds
+        self.window_hours = window_hours
+        self.gravity = gravity
+        self.refreshes = 0
+        self.skipped = 0
+        self.last_refresh_at = None
+        self.last_duration_ms = None
+        self.last_error = None
+        self._task = None
+
+    async def refresh(self):
+        """Run one refresh, returns False if another worker holds the lock."""
+        start = time.perf_counter()
+        async with self.session_factory() as db:
+            locked = (await db.execute(text("SELECT pg_try_advisory_xact_lock(:key)"),
+                                       {"key": REFRESH_LOCK_KEY})).scalar()
+            if not locked:
+                self.skipped += 1
+                return False
+            counts = (await db.execute(REFRESH_TRENDING, {
+                "gravity": self.gravity, "window_hours": self.window_hours})).first()
+            await db.commit()
+
+        self.refreshes += 1
+        self.last_refresh_at = datetime.now(timezone.utc)
+        self.last_duration_ms = (time.perf_counter() - start) * 1000
+        self.last_error = None
+        logger.info("trending refreshed: %s ranked, %s expired in %.1f ms",
+                    counts.ranked, counts.expired, self.last_duration_ms)
+        return True
+
+    async def _run(self):
+        while True:
+            try:
+                await self.refresh()
+            except Exception as error:
+                self.last_error = str(error)
+                logger.exception("trending refresh failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self.interval_seconds > 0 and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self):
+        return {
+            "interval_seconds": self.interval_seconds,
+            "refreshes": self.refreshes,
+            "skipped": self.skipped,
+            "last_refresh_at": self.last_refresh_at.isoformat() if self.last_refresh_at else None,
+            "last_duration_ms": self.last_duration_ms,
+            "last_error": self.last_error,
+        }
+
+
+refresher = TrendingRefresher(database.AsyncSessionLocal,
+                              interval_seconds=settings.trending_refresh_seconds,
+                              window_hours=settings.trending_window_hours,
+                              gravity=settings.trending_gravity)
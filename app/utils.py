@@ -1,5 +1,18 @@
+import asyncio
+import base64
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
 from passlib.context import CryptContext
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from .config import settings
+
+# pinning min and max to the configured work factor makes verify_and_update
+# flag every hash made with a different one, so logins transparently rehash
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto",
+                           bcrypt__default_rounds=settings.bcrypt_rounds,
+                           bcrypt__min_rounds=settings.bcrypt_rounds,
+                           bcrypt__max_rounds=settings.bcrypt_rounds)
 
 
 def hash(password: str):
@@ -8,3 +21,68 @@ def hash(password: str):
 
 def verify(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
+
+
+def verify_and_update(plain_password, hashed_password):
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+# bcrypt burns 100ms+ of CPU per call, run it in its own processes so a login
+# storm can't starve the event loop or the threadpool the sync routes share
+_password_pool = None
+_password_pool_pending = 0
+
+
+def _get_password_pool():
+    global _password_pool
+    if _password_pool is None:
+        _password_pool = ProcessPoolExecutor(max_workers=settings.password_hash_workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+    return _password_pool
+
+
+async def _run_in_password_pool(func, *args):
+    # only touched from the event loop thread, so a plain counter is enough
+    global _password_pool_pending
+    if _password_pool_pending >= settings.password_hash_max_pending:
+        raise PasswordHasherBusy()
+    _password_pool_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_get_password_pool(), func, *args)
+    finally:
+        _password_pool_pending -= 1
+
+
+async def hash_async(password: str):
+    return await _run_in_password_pool(hash, password)
+
+
+async def verify_and_update_async(plain_password, hashed_password):
+    return await _run_in_password_pool(verify_and_update, plain_password, hashed_password)
+
+
+def shutdown_password_pool():
+    global _password_pool
+    if _password_pool is not None:
+        _password_pool.shutdown()
+        _password_pool = None
+
+
+# keyset pagination cursors are an opaque url-safe encoding of the sort key
+# (created_at, id) of the last row on the previous page
+def encode_cursor(created_at: datetime, id: int):
+    raw = f"{created_at.isoformat()}|{id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError(f"Invalid cursor: {cursor}")
@@ -0,0 +1,170 @@
+import asyncio
+from typing import List, Tuple
+
+from sqlalchemy import text
+
+from . import database
+from .responses import response_cache
+from .config import settings
+
+# one statement applies a whole round of votes: rows on missing posts are
+# dropped by the join, adds and removes go through data-modifying CTEs and the
+# post counters move by the net change, all in the statement's snapshot
+APPLY_VOTES = text("""
+WITH batch AS (
+    SELECT * FROM unnest(CAST(:user_ids AS integer[]), CAST(:post_ids AS integer[]),
+                         CAST(:dirs AS integer[])) AS b(user_id, post_id, dir)
+), live AS (
+    SELECT batch.* FROM batch JOIN posts ON posts.id = batch.post_id
+), added AS (
+    INSERT INTO votes (user_id, post_id)
+    SELECT user_id, post_id FROM live WHERE dir = 1
+    ON CONFLICT DO NOTHING
+    RETURNING user_id, post_id
+), removed AS (
+    DELETE FROM votes USING live
+    WHERE live.dir <> 1 AND votes.user_id = live.user_id AND votes.post_id = live.post_id
+    RETURNING votes.user_id, votes.post_id
+), counted AS (
+    UPDATE posts SET vote_count = posts.vote_count + changes.delta
+    FROM (SELECT post_id, SUM(delta) AS delta FROM (
+              SELECT post_id, 1 AS delta FROM added
+              UNION ALL
+              SELECT post_id, -1 AS delta FROM removed) AS deltas
+          GROUP BY post_id) AS changes
+    WHERE posts.id = changes.post_id
+)
+SELECT user_id, post_id, 'added' AS outcome FROM added
+UNION ALL
+SELECT user_id, post_id, 'removed' AS outcome FROM removed
+UNION ALL
+SELECT DISTINCT CAST(NULL AS integer), post_id, 'post' AS outcome FROM live
+""")
+
+
+def _result(post_id: int, dir: int, status_code: int, detail: str):
+    return {"post_id": post_id, "dir": dir, "status_code": status_code, "detail": detail}
+
+
+async def _apply_round(db, items: List[Tuple[int, int, int]]):
+    rows = (await db.execute(APPLY_VOTES, {
+        "user_ids": [user_id for user_id, _, _ in items],
+        "post_ids": [post_id for _, post_id, _ in items],
+        "dirs": [dir for _, _, dir in items],
+    })).all()
+    added = {(row.user_id, row.post_id) for row in rows if row.outcome == "added"}
+    removed = {(row.user_id, row.post_id) for row in rows if row.outcome == "removed"}
+    posts = {row.post_id for row in rows if row.outcome == "post"}
+
+    results = []
+    for user_id, post_id, dir in items:
+        if (user_id, post_id) in added:
+            results.append(_result(post_id, dir, 201, "successfully added vote"))
+        elif (user_id, post_id) in removed:
+            results.append(_result(post_id, dir, 201, "successfully deleted vote"))
+        elif post_id not in posts:
+            results.append(_result(post_id, dir, 404, f"Post with id: {post_id} does not exist"))
+        elif dir == 1:
+            results.append(_result(post_id, dir, 409, f"user {user_id} has alredy voted on post {post_id}"))
+        else:
+            results.append(_result(post_id, dir, 404, "Vote does not exist"))
+    return results
+
+
+async def apply_votes(db, items: List[Tuple[int, int, int]]):
+    """Apply (user_id, post_id, dir) votes in order, returning one result per item.
+
+    Runs in the caller's transaction. A user voting on the same post more than once
+    in a batch (e.g. vote then unvote) is applied in a later round, so the outcome
+    matches sending the votes one by one.
+    """
+    results = [None] * len(items)
+    remaining = list(enumerate(items))
+    while remaining:
+        seen, this_round, next_round = set(), [], []
+        for index, item in remaining:
+            key = item[:2]
+            (next_round if key in seen else this_round).append((index, item))
+            seen.add(key)
+        round_results = await _apply_round(db, [item for _, item in this_round])
+        for (index, _), result in zip(this_round, round_results):
+            results[index] = result
+        remaining = next_round
+    return results
+
+
+async def invalidate_posts(results):
+    # drop the cached GET /posts/{id} of every post whose counter moved
+    for post_id in {result["post_id"] for result in results if result["status_code"] == 201}:
+        await response_cache.invalidate(f"post:{post_id}")
+
+
+class VoteBuffer:
+    """Coalesces single votes from concurrent requests into one apply_votes call.
+
+    Votes are flushed window_ms after the first one arrives or as soon as
+    max_items are waiting, each request awaits its own result.
+    """
+
+    def __init__(self, session_factory, window_ms: int, max_items: int):
+        self.session_factory = session_factory
+        self.window_ms = window_ms
+        self.max_items = max_items
+        self._pending = []
+        self._timer = None
+        self._flush_lock = asyncio.Lock()
+        # the loop only holds weak references to tasks, a flush nobody
+        # references could be collected with its submitters still waiting
+        self._tasks = set()
+
+    async def submit(self, user_id: int, post_id: int, dir: int):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append(((user_id, post_id, dir), future))
+        if len(self._pending) >= self.max_items:
+            self._schedule_flush(loop)
+        elif self._timer is None:
+            self._timer = loop.call_later(
+                self.window_ms / 1000, self._schedule_flush, loop)
+        return await future
+
+    def _schedule_flush(self, loop):
+        task = loop.create_task(self.flush())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def drain(self):
+        """Flush what's waiting and wait for the flushes already scheduled."""
+        await self.flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        # one flush at a time keeps votes from the same user applied in order
+        async with self._flush_lock:
+            try:
+                async with self.session_factory() as db:
+                    results = await apply_votes(db, [item for item, _ in pending])
+                    await db.commit()
+                await invalidate_posts(results)
+            except Exception as error:
+                for _, future in pending:
+                    if not future.done():
+                        future.set_exception(error)
+                return
+
+        for (_, future), result in zip(pending, results):
+            if not future.done():
+                future.set_result(result)
+
+
+vote_buffer = VoteBuffer(database.AsyncSessionLocal,
+                         window_ms=settings.vote_coalesce_window_ms,
+                         max_items=settings.vote_coalesce_max_items)
@@ -0,0 +1,78 @@
+"""Measure compression levels against rendered pages of PostOut rows.
+
+For every gzip level (and brotli quality when the brotli package is
+installed) reports compression ms per page, compressed size and the
+estimated time to first byte plus transfer over a mobile link, next to the
+uncompressed page. Run from the repo root:
+
+    python -m benchmarks.bench_compression --posts 100 --bandwidth-kbps 1600
+"""
+import argparse
+import gzip
+import random
+import time
+from typing import List
+
+from app import schemas
+from app.compression import brotli
+from app.responses import model_response
+
+from .bench_serialization import make_rows
+
+WORDS = ("patient doctor appointment results blood pressure follow up visit "
+         "medication dose morning evening symptoms improved worse clinic note "
+         "the a and of to in for with on was is it this that").split()
+
+
+def make_page(posts: int, content_words: int = 120):
+    # random prose compresses like real posts, "x" * n would flatter every level
+    generator = random.Random(0)
+    rows = make_rows(posts)
+    for row in rows:
+        row.Post.content = " ".join(generator.choice(WORDS) for _ in range(content_words))
+    return model_response(List[schemas.PostOut], rows).body
+
+
+def measure(compress, body: bytes, iterations: int, bandwidth_kbps: int):
+    compressed = compress(body)
+    start = time.perf_counter()
+    for _ in range(iterations):
+        compress(body)
+    cpu_ms = (time.perf_counter() - start) / iterations * 1000
+    transfer_ms = len(compressed) * 8 / bandwidth_kbps
+    return {
+        "cpu_ms": cpu_ms,
+        "bytes": len(compressed),
+        "ratio": len(body) / len(compressed),
+        "total_ms": cpu_ms + transfer_ms,
+    }
+
+
+def run(posts: int = 100, iterations: int = 50, bandwidth_kbps: int = 1600):
+    body = make_page(posts)
+    results = {"identity": measure(lambda data: data, body, iterations, bandwidth_kbps)}
+    for level in range(1, 10):
+        results[f"gzip-{level}"] = measure(
+            lambda data: gzip.compress(data, compresslevel=level, mtime=0), body, iterations, bandwidth_kbps)
+    if brotli is not None:
+        for quality in range(0, 12):
+            results[f"br-{quality}"] = measure(
+                lambda data: brotli.compress(data, quality=quality), body, iterations, bandwidth_kbps)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--bandwidth-kbps", type=int, default=1600)
+    args = parser.parse_args()
+
+    results = run(args.posts, args.iterations, args.bandwidth_kbps)
+    for name, result in results.items():
+        print(f"{name:>10}: {result['cpu_ms']:.2f} ms cpu  {result['bytes']:>8} bytes  "
+              f"x{result['ratio']:.1f}  {result['total_ms']:.1f} ms at {args.bandwidth_kbps} kbps")
+
+
+if __name__ == "__main__":
+    main()
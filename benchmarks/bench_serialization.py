@@ -0,0 +1,82 @@
+"""Compare FastAPI's default response path with responses.model_response.
+
+Renders a page of PostOut rows both ways and reports ms per page and
+bytes/sec. Run from the repo root:
+
+    python -m benchmarks.bench_serialization --posts 100
+"""
+import argparse
+import asyncio
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+from app import schemas
+from app.responses import model_response
+
+
+def make_rows(count: int, content_size: int = 600):
+    owner = SimpleNamespace(id=1, email="owner@gmail.com",
+                            created_at=datetime(2023, 6, 1, tzinfo=timezone.utc))
+    return [SimpleNamespace(
+        Post=SimpleNamespace(id=id, title=f"post title {id}", content="x" * content_size,
+                             published=True, created_at=datetime.now(timezone.utc),
+                             owner_id=owner.id, owner=owner),
+        votes=id % 50) for id in range(count)]
+
+
+def default_path(loop, field, rows):
+    # what FastAPI does for a route returning ORM rows with a response_model
+    content = loop.run_until_complete(serialize_response(field=field, response_content=rows))
+    return JSONResponse(content).body
+
+
+def fast_path(rows):
+    return model_response(List[schemas.PostOut], rows).body
+
+
+def measure(render, iterations: int):
+    render()
+    start = time.perf_counter()
+    for _ in range(iterations):
+        body = render()
+    elapsed = time.perf_counter() - start
+    return {
+        "ms_per_page": elapsed / iterations * 1000,
+        "bytes_per_page": len(body),
+        "bytes_per_sec": len(body) * iterations / elapsed,
+    }
+
+
+def run(posts: int = 100, iterations: int = 200):
+    rows = make_rows(posts)
+    field = create_response_field(name="Response_get_posts", type_=List[schemas.PostOut])
+    loop = asyncio.new_event_loop()
+    try:
+        return {
+            "default": measure(lambda: default_path(loop, field, rows), iterations),
+            "model_response": measure(lambda: fast_path(rows), iterations),
+        }
+    finally:
+        loop.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    results = run(args.posts, args.iterations)
+    for name, result in results.items():
+        print(f"{name:>15}: {result['ms_per_page']:.2f} ms/page  "
+              f"{result['bytes_per_sec'] / 1e6:.1f} MB/s  ({result['bytes_per_page']} bytes)")
+
+
+if __name__ == "__main__":
+    main()
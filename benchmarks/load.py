@@ -0,0 +1,152 @@
+"""Drive a running API with a weighted mix of requests and report latencies.
+
+Every worker thread logs in as one of the seeded users (see benchmarks.seed)
+and then picks requests from --mix until --duration runs out. Requests made
+during --warmup are not counted. Expected refusals (a repeated vote is a 409,
+removing a vote that doesn't exist a 404) count as successes:
+
+    python -m benchmarks.load --base-url http://localhost:8000 --concurrency 16 --duration 30 \\
+        --mix posts=50,post=30,vote=15,login=5 --output load.json
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+import requests
+
+from .report import make_report, summarize, write_report
+
+EXPECTED = {
+    "login": {200},
+    "posts": {200},
+    "post": {200},
+    "trending": {200},
+    "vote": {201, 404, 409},
+}
+
+
+def parse_mix(mix: str):
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in EXPECTED:
+            raise argparse.ArgumentTypeError(f"unknown request {name!r}, pick from {', '.join(EXPECTED)}")
+        weights[name] = float(weight or 1)
+    return weights
+
+
+class Worker(threading.Thread):
+    def __init__(self, number: int, args, manifest, mix, start_at: float, stop_at: float, results):
+        super().__init__(daemon=True)
+        self.args = args
+        self.manifest = manifest
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.start_at = start_at
+        self.stop_at = stop_at
+        self.results = results
+        self.random = random.Random(args.seed + number)
+        self.session = requests.Session()
+        self.email = manifest["emails"][number % len(manifest["emails"])]
+
+    def login(self):
+        return self.session.post(f"{self.args.base_url}/login",
+                                 data={"username": self.email, "password": self.manifest["password"]})
+
+    def posts(self):
+        return self.session.get(f"{self.args.base_url}/posts/",
+                                params={"limit": self.args.page_size, "skip": self.random.randrange(0, 200)})
+
+    def post(self):
+        return self.session.get(f"{self.args.base_url}/posts/{self.random.choice(self.manifest['post_ids'])}")
+
+    def trending(self):
+        return self.session.get(f"{self.args.base_url}/posts/trending", params={"limit": self.args.page_size})
+
+    def vote(self):
+        return self.session.post(f"{self.args.base_url}/vote/", json={
+            "post_id": self.random.choice(self.manifest["post_ids"]), "dir": self.random.randint(0, 1)})
+
+    def run(self):
+        response = self.login()
+        response.raise_for_status()
+        self.session.headers["Authorization"] = f"Bearer {response.json()['access_token']}"
+
+        while True:
+            name = self.random.choices(self.names, self.weights)[0]
+            start = time.perf_counter()
+            if start >= self.stop_at:
+                return
+            try:
+                status_code = getattr(self, name)().status_code
+            except requests.RequestException:
+                status_code = 0
+            elapsed = time.perf_counter() - start
+            if start >= self.start_at:
+                self.results.record(name, elapsed, status_code)
+
+
+class Results:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+
+    def record(self, name: str, seconds: float, status_code: int):
+        with self._lock:
+            self.latencies[name].append(seconds)
+            self.statuses[name][status_code] += 1
+
+    def summary(self, duration: float):
+        summary = {}
+        for name, latencies in self.latencies.items():
+            statuses = self.statuses[name]
+            errors = sum(count for status_code, count in statuses.items() if status_code not in EXPECTED[name])
+            summary[name] = {
+                **summarize(latencies),
+                "rps": len(latencies) / duration,
+                "errors": errors,
+                "statuses": {str(status_code): count for status_code, count in sorted(statuses.items())},
+            }
+        everything = [seconds for latencies in self.latencies.values() for seconds in latencies]
+        summary["total"] = {**summarize(everything), "rps": len(everything) / duration,
+                            "errors": sum(result["errors"] for result in summary.values())}
+        return summary
+
+
+def run(args, manifest):
+    results = Results()
+    start_at = time.perf_counter() + args.warmup
+    stop_at = start_at + args.duration
+    workers = [Worker(number, args, manifest, args.mix, start_at, stop_at, results)
+               for number in range(args.concurrency)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return results.summary(args.duration)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--manifest", default="benchmarks/seed.json")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=30)
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--mix", type=parse_mix, default="posts=50,post=30,vote=15,login=5")
+    parser.add_argument("--page-size", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    with open(args.manifest) as file:
+        manifest = json.load(file)
+    write_report(make_report("load", run(args, manifest), args), args.output)
+
+
+if __name__ == "__main__":
+    main()
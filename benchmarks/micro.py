@@ -0,0 +1,64 @@
+"""Micro-benchmarks for the per request hot spots.
+
+Times oauth2.verify_access_token with a cold and a warm token cache,
+utils.verify at the configured bcrypt rounds and PostOut serialization
+through model_response, reporting per call latency over --repeat rounds:
+
+    python -m benchmarks.micro --output micro.json
+"""
+import argparse
+import time
+from typing import List
+
+from fastapi import HTTPException
+
+from app import oauth2, schemas, utils
+from app.responses import model_response
+
+from .bench_serialization import make_rows
+from .report import make_report, summarize, write_report
+
+
+def per_call(func, number: int, repeat: int, setup=None):
+    # one sample per round, each the average of number calls
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return summarize(samples)
+
+
+def run(repeat: int = 20, posts: int = 100):
+    token = oauth2.create_access_token({"user_id": 1})
+    credentials_exception = HTTPException(status_code=401)
+    hashed = utils.hash("benchmark-password")
+    rows = make_rows(posts)
+
+    return {
+        "verify_access_token_cold": per_call(
+            lambda: oauth2.verify_access_token(token, credentials_exception), 1, repeat * 50,
+            setup=oauth2.token_cache.clear),
+        "verify_access_token_cached": per_call(
+            lambda: oauth2.verify_access_token(token, credentials_exception), 1000, repeat),
+        "password_verify": per_call(lambda: utils.verify("benchmark-password", hashed), 1, repeat),
+        f"post_out_serialize_{posts}": per_call(
+            lambda: model_response(List[schemas.PostOut], rows).body, 10, repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--posts", type=int, default=100)
+    parser.add_argument("--output")
+    args = parser.parse_args()
+
+    write_report(make_report("micro", run(args.repeat, args.posts), args), args.output)
+
+
+if __name__ == "__main__":
+    main()
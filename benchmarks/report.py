@@ -0,0 +1,96 @@
+"""Shared JSON report format for the benchmarks, and a comparison between two runs.
+
+Every report carries the git commit, interpreter and arguments it was made
+with next to its results, so runs stay comparable over time:
+
+    python -m benchmarks.report before.json after.json
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional, Sequence
+
+
+def summarize(seconds: Sequence[float]):
+    """Latency summary in milliseconds for a list of samples in seconds."""
+    if not seconds:
+        return {"count": 0}
+    ordered = sorted(seconds)
+
+    def percentile(fraction):
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)] * 1000
+
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": percentile(0.50),
+        "p90_ms": percentile(0.90),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def make_report(name: str, results: Dict, args: Optional[argparse.Namespace] = None):
+    return {
+        "benchmark": name,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "args": vars(args) if args is not None else {},
+        "results": results,
+    }
+
+
+def write_report(report: Dict, output: Optional[str] = None):
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output:
+        with open(output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+def compare(before: Dict, after: Dict, metric: str):
+    rows = []
+    for name, result in after["results"].items():
+        old = before["results"].get(name, {}).get(metric)
+        new = result.get(metric)
+        if old is None or new is None:
+            continue
+        change = (new - old) / old * 100 if old else 0.0
+        rows.append((name, old, new, change))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--metric", default="p50_ms")
+    args = parser.parse_args()
+
+    with open(args.before) as file:
+        before = json.load(file)
+    with open(args.after) as file:
+        after = json.load(file)
+
+    print(f"{before['benchmark']}: {before['git_commit']} -> {after['git_commit']} ({args.metric})")
+    for name, old, new, change in compare(before, after, args.metric):
+        print(f"{name:>30}: {old:10.3f} -> {new:10.3f}  {change:+6.1f}%")
+
+
+if __name__ == "__main__":
+    main()
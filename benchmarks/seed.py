@@ -0,0 +1,95 @@
+"""Seed users, posts and votes for load testing.
+
+Users are named bench<n>@example.com and share one password, so the load
+driver can log in as any of them. A fixed --seed makes the data set
+reproducible; --reset drops earlier bench users first (their posts and votes
+go with them). Writes a manifest the load driver reads:
+
+    python -m benchmarks.seed --users 100 --posts-per-user 20 --votes-per-user 50
+"""
+import argparse
+import json
+import random
+
+from sqlalchemy import create_engine, delete, func, insert, select, update
+
+from app import models, utils
+from app.database import SQLALCHEMY_DATABASE_URL
+
+EMAIL = "bench{}@example.com"
+PASSWORD = "bench-password"
+WORDS = ("patient doctor appointment results blood pressure follow up visit "
+         "medication dose morning evening symptoms improved worse clinic note "
+         "the a and of to in for with on was is it this that").split()
+
+
+def _chunks(rows, size: int = 5000):
+    for start in range(0, len(rows), size):
+        yield rows[start:start + size]
+
+
+def seed(engine, users: int, posts_per_user: int, votes_per_user: int, seed: int = 0, reset: bool = False):
+    generator = random.Random(seed)
+    # hashing once keeps seeding fast, logins still pay the full bcrypt cost
+    password = utils.hash(PASSWORD)
+
+    with engine.begin() as conn:
+        if reset:
+            conn.execute(delete(models.User).where(models.User.email.like(EMAIL.format("%"))))
+
+        user_rows = [{"email": EMAIL.format(n), "password": password, "user_type": models.UserType.PATIENT}
+                     for n in range(users)]
+        user_ids = []
+        for chunk in _chunks(user_rows):
+            user_ids += [row.id for row in conn.execute(insert(models.User).values(chunk).returning(models.User.id))]
+
+        post_rows = [{"owner_id": user_id,
+                      "title": " ".join(generator.choice(WORDS) for _ in range(6)),
+                      "content": " ".join(generator.choice(WORDS) for _ in range(generator.randint(20, 200)))}
+                     for user_id in user_ids for _ in range(posts_per_user)]
+        post_ids = []
+        for chunk in _chunks(post_rows):
+            post_ids += [row.id for row in conn.execute(insert(models.Post).values(chunk).returning(models.Post.id))]
+
+        vote_rows = []
+        for user_id in user_ids:
+            for post_id in generator.sample(post_ids, min(votes_per_user, len(post_ids))):
+                vote_rows.append({"user_id": user_id, "post_id": post_id})
+        for chunk in _chunks(vote_rows):
+            conn.execute(insert(models.Vote).values(chunk))
+
+        # same backfill as the vote_count migration, limited to the new posts
+        if post_ids:
+            counts = select(func.count()).where(models.Vote.post_id == models.Post.id).scalar_subquery()
+            conn.execute(update(models.Post).where(models.Post.id.in_(post_ids)).values(vote_count=counts))
+
+    return {
+        "emails": [row["email"] for row in user_rows],
+        "password": PASSWORD,
+        "user_ids": user_ids,
+        "post_ids": post_ids,
+        "votes": len(vote_rows),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--posts-per-user", type=int, default=20)
+    parser.add_argument("--votes-per-user", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--reset", action="store_true")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL)
+    parser.add_argument("--manifest", default="benchmarks/seed.json")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    manifest = seed(engine, args.users, args.posts_per_user, args.votes_per_user, args.seed, args.reset)
+    with open(args.manifest, "w") as file:
+        json.dump(manifest, file)
+    print(f"seeded {len(manifest['user_ids'])} users, {len(manifest['post_ids'])} posts and "
+          f"{manifest['votes']} votes, manifest in {args.manifest}")
+
+
+if __name__ == "__main__":
+    main()
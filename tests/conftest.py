@@ -1,15 +1,21 @@
+import asyncio
+from contextlib import contextmanager
+
 from fastapi.testclient import TestClient
 import pytest
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import NullPool
 from app.main import app
 
 from app.config import settings
-from app.database import get_db
+from app.database import get_db, get_async_db, get_read_db
 from app.database import Base
-from app.oauth2 import create_access_token
-from app import models
+from app.oauth2 import create_access_token, user_cache
+from app.responses import response_cache
+from app import metrics, models
 from alembic import command
 
 
@@ -22,6 +28,26 @@ engine = create_engine(SQLALCHEMY_DATABASE_URL)
 TestingSessionLocal = sessionmaker(
     autocommit=False, autoflush=False, bind=engine)
 
+# NullPool: asyncpg connections are tied to the event loop the TestClient
+# request ran on, so don't keep them around between requests
+async_engine = create_async_engine(SQLALCHEMY_DATABASE_URL.replace(
+    'postgresql://', 'postgresql+asyncpg://', 1), poolclass=NullPool)
+
+TestingAsyncSessionLocal = sessionmaker(
+    async_engine, class_=AsyncSession, autocommit=False, autoflush=False, expire_on_commit=False)
+
+metrics.instrument_engine(engine)
+metrics.instrument_engine(async_engine.sync_engine)
+
+
+def run_async(coroutine):
+    """Run coroutine to completion on a fresh event loop, outside the TestClient's."""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coroutine)
+    finally:
+        loop.close()
+
 
 @pytest.fixture()
 def session():
@@ -43,14 +69,23 @@ def client(session):
             yield session
         finally:
             session.close()
+    async def override_get_async_db():
+        async with TestingAsyncSessionLocal() as db:
+            yield db
+
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_read_db] = override_get_async_db
+    # tables and their id sequences are recreated for every test
+    user_cache.clear()
+    response_cache.clear()
     yield TestClient(app)
 
 
 @pytest.fixture
 def test_user2(client):
     user_data = {"email": "sanjeev123@gmail.com",
-                 "password": "password123"}
+                 "password": "password123", "user_type": "Patient"}
     res = client.post("/users/", json=user_data)
 
     assert res.status_code == 201
@@ -63,7 +98,7 @@ def test_user2(client):
 @pytest.fixture
 def test_user(client):
     user_data = {"email": "sanjeev@gmail.com",
-                 "password": "password123"}
+                 "password": "password123", "user_type": "Patient"}
     res = client.post("/users/", json=user_data)
 
     assert res.status_code == 201
@@ -122,3 +157,37 @@ def test_posts(test_user, session, test_user2):
 
     posts = session.query(models.Post).all()
     return posts
+
+
+class StatementRecorder:
+    def __init__(self):
+        self.statements = []
+        # (engine, statement, parameters) of single executions, to replay
+        self.executions = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+        if not executemany:
+            self.executions.append((conn.engine, statement, parameters))
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@pytest.fixture
+def count_statements():
+    """Record the SQL statements issued on both test engines inside the block."""
+    @contextmanager
+    def recorder():
+        statements = StatementRecorder()
+        engines = (engine, async_engine.sync_engine)
+        for target in engines:
+            event.listen(target, "before_cursor_execute", statements)
+        try:
+            yield statements
+        finally:
+            for target in engines:
+                event.remove(target, "before_cursor_execute", statements)
+
+    return recorder
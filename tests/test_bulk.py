@@ -0,0 +1,59 @@
+import csv
+import io
+import json
+
+from app import models
+
+
+def test_import_ndjson(authorized_client, test_user, session):
+    lines = [json.dumps({"title": f"title {n}", "content": f"content {n}"}) for n in range(5)]
+    lines.insert(2, '{"title": "no content"}')
+    lines.insert(4, "not json")
+    res = authorized_client.post("/posts/import", data=("\n".join(lines) + "\n").encode())
+
+    assert res.status_code == 200
+    assert res.json()["imported"] == 5
+    assert res.json()["error_count"] == 2
+    assert [error["line"] for error in res.json()["errors"]] == [3, 5]
+    posts = session.query(models.Post).filter(models.Post.owner_id == test_user["id"]).order_by(models.Post.id).all()
+    assert [post.title for post in posts] == [f"title {n}" for n in range(5)]
+    assert all(post.vote_count == 0 and post.published for post in posts)
+
+
+def test_import_csv_chunks(authorized_client, test_user, session, monkeypatch):
+    monkeypatch.setattr("app.config.settings.post_import_chunk_size", 2)
+    body = 'title,content,published\nfirst,"multi\nline, quoted",false\nsecond,plain,true\nthird,more,true\n'
+
+    def chunks():
+        # split mid row to exercise the line reassembly
+        for start in range(0, len(body), 7):
+            yield body[start:start + 7].encode()
+
+    res = authorized_client.post("/posts/import", params={"format": "csv"}, data=chunks())
+    assert res.status_code == 200
+    assert res.json() == {"imported": 3, "error_count": 0, "errors": []}
+    first = session.query(models.Post).filter(models.Post.title == "first").one()
+    assert first.content == "multi\nline, quoted"
+    assert first.published is False
+
+
+def test_import_unauthorized(client):
+    res = client.post("/posts/import", data=b'{"title": "t", "content": "c"}\n')
+    assert res.status_code == 401
+
+
+def test_export_ndjson(authorized_client, test_user, test_posts, monkeypatch):
+    monkeypatch.setattr("app.config.settings.post_export_chunk_size", 2)
+    res = authorized_client.get("/posts/export")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in res.text.splitlines()]
+    own = [post for post in test_posts if post.owner_id == test_user["id"]]
+    assert [row["id"] for row in rows] == sorted(post.id for post in own)
+
+
+def test_export_csv(authorized_client, test_user, test_posts):
+    res = authorized_client.get("/posts/export", params={"format": "csv"})
+    assert res.status_code == 200
+    rows = list(csv.DictReader(io.StringIO(res.text)))
+    assert {row["title"] for row in rows} == {post.title for post in test_posts if post.owner_id == test_user["id"]}
@@ -0,0 +1,70 @@
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware, accepted_encodings
+from app.responses import ORJSONResponse
+
+
+def make_client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=100,
+                       content_types=["application/json", "application/x-ndjson"])
+
+    @app.get("/big")
+    def big():
+        return ORJSONResponse([{"content": "some post content"}] * 50, headers={"ETag": '"abc"'})
+
+    @app.get("/small")
+    def small():
+        return ORJSONResponse({"ok": True})
+
+    @app.get("/text")
+    def text():
+        return PlainTextResponse("x" * 1000)
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse((b'{"line": %d}\n' % i for i in range(100)),
+                                 media_type="application/x-ndjson")
+
+    return TestClient(app), app
+
+
+def test_accepted_encodings():
+    assert accepted_encodings("gzip, deflate, br;q=0") == {"gzip", "deflate"}
+    assert accepted_encodings("") == {""}
+
+
+def test_gzip_large_json():
+    client, _ = make_client()
+    res = client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert res.headers["vary"] == "Accept-Encoding"
+    assert res.headers["etag"] == 'W/"abc"'
+    assert res.json() == [{"content": "some post content"}] * 50
+
+
+def test_skips_small_other_types_and_identity():
+    client, _ = make_client()
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/text", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_precompressed_cache():
+    client, app = make_client()
+    client.get("/big", headers={"Accept-Encoding": "gzip"})
+    middleware = app.middleware_stack
+    while not isinstance(middleware, CompressionMiddleware):
+        middleware = middleware.app
+    client.get("/big", headers={"Accept-Encoding": "gzip"})
+    assert middleware.cache.stats()["hits"] == 1
+
+
+def test_gzip_stream():
+    client, _ = make_client()
+    res = client.get("/stream", headers={"Accept-Encoding": "gzip"})
+    assert res.headers["content-encoding"] == "gzip"
+    assert "content-length" not in res.headers
+    assert res.content.splitlines()[-1] == b'{"line": 99}'
@@ -0,0 +1,56 @@
+import time
+
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.datastructures import Headers
+from starlette.responses import PlainTextResponse
+
+from app import database
+from .conftest import run_async
+
+
+def test_read_session_factory_without_replica():
+    headers = Headers({"authorization": "Bearer token"})
+    assert run_async(database.read_session_factory(headers)) is database.AsyncSessionLocal
+
+
+def test_read_your_writes(monkeypatch):
+    replica_session = object()
+    monkeypatch.setattr(database, "ReplicaSessionLocal", replica_session)
+    database.recent_writers.clear()
+
+    writer = Headers({"authorization": "Bearer writer"})
+    reader = Headers({"authorization": "Bearer reader"})
+    assert run_async(database.read_session_factory(writer)) is replica_session
+
+    run_async(database.record_write(writer))
+    assert run_async(database.read_session_factory(writer)) is database.AsyncSessionLocal
+    assert run_async(database.read_session_factory(reader)) is replica_session
+    assert run_async(database.read_session_factory(Headers())) is replica_session
+
+
+def test_read_your_writes_cookie(monkeypatch):
+    replica_session = object()
+    monkeypatch.setattr(database, "ReplicaSessionLocal", replica_session)
+    database.recent_writers.clear()
+
+    # another worker's write, only the cookie says so
+    fresh = Headers({"cookie": f"read_your_writes={int(time.time()) + 5}"})
+    expired = Headers({"cookie": f"read_your_writes={int(time.time()) - 1}"})
+    assert run_async(database.read_session_factory(fresh)) is database.AsyncSessionLocal
+    assert run_async(database.read_session_factory(expired)) is replica_session
+    assert run_async(database.read_session_factory(Headers({"cookie": "read_your_writes=junk"}))) is replica_session
+
+
+def test_read_your_writes_middleware_sets_cookie(monkeypatch):
+    monkeypatch.setattr(database, "ReplicaSessionLocal", object())
+    inner = Starlette()
+
+    @inner.route("/", methods=["GET", "POST"])
+    async def endpoint(request):
+        return PlainTextResponse("ok")
+
+    client = TestClient(database.ReadYourWritesMiddleware(inner))
+    assert "read_your_writes" not in client.get("/").cookies
+    res = client.post("/")
+    assert float(res.cookies["read_your_writes"]) > time.time()
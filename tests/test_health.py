@@ -0,0 +1,26 @@
+from sqlalchemy import create_engine
+
+from app.database import InstrumentedQueuePool, pool_status
+from .conftest import SQLALCHEMY_DATABASE_URL
+
+
+def test_pool_status(client):
+    res = client.get("/health/pool")
+    assert res.status_code == 200
+    assert set(res.json()["pools"]) == {"sync", "async"}
+    assert "checked_out" in res.json()["pools"]["sync"]
+
+
+def test_instrumented_pool_records_checkouts():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL,
+                           poolclass=InstrumentedQueuePool, pool_size=1, max_overflow=0)
+    with engine.connect():
+        assert pool_status(engine.pool)["checked_out"] == 1
+    with engine.connect():
+        pass
+
+    status = pool_status(engine.pool)
+    assert status["checked_out"] == 0
+    assert status["checkouts"] == 2
+    assert status["timeouts"] == 0
+    engine.dispose()
@@ -0,0 +1,179 @@
+import json
+import re
+
+import pytest
+from sqlalchemy import text
+from .conftest import async_engine, engine, run_async
+
+# a full scan left over a table this big means a lookup is missing its index
+FULL_SCAN_THRESHOLD = 1000
+
+SEED = """
+INSERT INTO users (email, password, user_type, is_superuser)
+SELECT 'user' || n || '@example.com', 'x', CASE WHEN n % 2 = 0 THEN 'DOCTOR' ELSE 'PATIENT' END::usertype, false
+FROM generate_series(1, 4000) AS n;
+INSERT INTO language_models (name) SELECT 'model ' || n FROM generate_series(1, 4000) AS n;
+INSERT INTO doctors (user_id, degree) SELECT id, 'MD' FROM users WHERE user_type = 'DOCTOR';
+INSERT INTO patients (user_id) SELECT id FROM users WHERE user_type = 'PATIENT';
+INSERT INTO posts (title, content, owner_id, created_at)
+SELECT 'title ' || n, 'content ' || n, 1 + n % 4000, now() - n * interval '1 minute'
+FROM generate_series(1, 20000) AS n;
+INSERT INTO votes (user_id, post_id)
+SELECT users.id, posts.id FROM users JOIN posts ON posts.id % 1000 = users.id % 1000;
+INSERT INTO post_trending (post_id, score, vote_count, refreshed_at)
+SELECT id, random(), 0, now() FROM posts;
+INSERT INTO doctor_requests (doctor_id, patient_id, status)
+SELECT doctors.id, patients.id, 'PENDING' FROM doctors JOIN patients ON patients.id % 400 = doctors.id % 400;
+INSERT INTO patient_requests (doctor_id, patient_id, status)
+SELECT doctor_id, patient_id, status FROM doctor_requests;
+INSERT INTO doctor_patient (doctor_id, patient_id) SELECT doctor_id, patient_id FROM doctor_requests;
+INSERT INTO refresh_tokens (user_id, token_hash, family_id, expires_at)
+SELECT 1 + n % 4000, 'hash' || n, 'family' || n, now() + interval '1 day' FROM generate_series(1, 8000) AS n;
+INSERT INTO questions (description, patient_id) SELECT 'question', 1 + n % 2000 FROM generate_series(1, 8000) AS n;
+INSERT INTO answers (content, question_id) SELECT 'answer', 1 + n % 8000 FROM generate_series(1, 16000) AS n;
+INSERT INTO comments (content, question_id, answer_id)
+SELECT 'comment', 1 + n % 8000, 1 + n % 16000 FROM generate_series(1, 16000) AS n;
+"""
+
+# the statements postgres runs for the foreign keys itself, on cascades and
+# on deletes from the referenced table, which no route sends
+FOREIGN_KEY_LOOKUPS = [
+    "DELETE FROM votes WHERE post_id = 50",
+    "DELETE FROM posts WHERE owner_id = 8",
+    "DELETE FROM refresh_tokens WHERE user_id = 8",
+    "DELETE FROM doctor_requests WHERE doctor_id = 3",
+    "DELETE FROM patient_requests WHERE patient_id = 3",
+    "DELETE FROM doctor_patient WHERE patient_id = 3",
+    "SELECT 1 FROM questions WHERE patient_id = 3",
+    "SELECT 1 FROM answers WHERE question_id = 3",
+    "SELECT 1 FROM comments WHERE question_id = 3",
+    "SELECT 1 FROM comments WHERE answer_id = 3",
+]
+
+STATEMENT = re.compile(r"\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+
+
+@pytest.fixture()
+def seeded(session):
+    session.execute(text(SEED))
+    session.commit()
+    session.execute(text("ANALYZE"))
+    session.commit()
+    return session
+
+
+def call_routes(client, user):
+    """Hit every route that reads or writes through an index, as user."""
+    responses = []
+
+    def call(method, url, **kwargs):
+        responses.append(getattr(client, method)(url, **kwargs))
+        return responses[-1]
+
+    def login(email, password):
+        tokens = call("post", "/login", data={"username": email, "password": password}).json()
+        client.headers = {**client.headers, "Authorization": f"Bearer {tokens['access_token']}"}
+        return tokens
+
+    # profiles first, the token claims are read at login
+    patient_id = call("post", "/users/patients", json={"user_id": user["id"]}).json()["id"]
+    doctor = call("post", "/users/", json={
+        "email": "indexed@example.com", "password": "password123", "user_type": "Doctor"}).json()
+    call("post", "/users/doctors", json={"user_id": doctor["id"], "degree": "MD"})
+
+    tokens = login(user["email"], user["password"])
+    post_id = call("post", "/posts/", json={"title": "indexed", "content": "indexed"}).json()["id"]
+    cursor = call("get", "/posts/").headers["X-Next-Cursor"]
+    call("get", "/posts/", params={"cursor": cursor})
+    call("get", "/posts/", params={"search": "12345", "search_mode": "fulltext"})
+    call("get", "/posts/trending")
+    call("get", "/posts/export")
+    call("get", "/posts/50")
+    call("put", f"/posts/{post_id}", json={"title": "updated", "content": "updated"})
+    call("post", "/vote/", json={"post_id": 50, "dir": 1})
+    call("post", "/vote/", json={"post_id": 50, "dir": 0})
+    call("post", "/vote/batch", json=[{"post_id": 51, "dir": 1}, {"post_id": 52, "dir": 0}])
+    call("delete", f"/posts/{post_id}")
+    call("get", "/users/8")
+    call("get", "/language_models/")
+    call("post", "/patient_requests/", params={"doctor_id": 3})
+    tokens = call("post", "/refresh", json={"refresh_token": tokens["refresh_token"]}).json()
+    call("post", "/logout", json={"refresh_token": tokens["refresh_token"]})
+
+    login("indexed@example.com", "password123")
+    call("post", "/doctor_requests/", params={"patient_id": patient_id})
+    return responses
+
+
+def explain(executions):
+    """EXPLAIN each statement on the engine that ran it, with the same parameters.
+
+    Sequential scans are priced out, so a plan only keeps one when no index
+    can serve the lookup, whatever the planner makes of the seeded sizes, and
+    falls back to reading whole indexes instead.
+    """
+    async def explain_all():
+        plans = []
+        async with async_engine.connect() as async_connection:
+            with engine.connect() as connection:
+                connection.exec_driver_sql("SET enable_seqscan = off")
+                await async_connection.exec_driver_sql("SET enable_seqscan = off")
+                for target, statement, parameters in executions:
+                    if target is engine:
+                        plan = connection.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters).scalar()
+                    else:
+                        # one parameter set, array parameters would read as several
+                        plan = (await async_connection.exec_driver_sql(
+                            "EXPLAIN (FORMAT JSON) " + statement, [tuple(parameters)])).scalar()
+                    # psycopg2 decodes the json, asyncpg hands back the text
+                    plans.append(json.loads(plan) if isinstance(plan, str) else plan)
+        return plans
+
+    return run_async(explain_all())
+
+
+# nodes that pass rows up as they read them, a Limit above still bounds the scan
+STREAMING = {"Limit", "Nested Loop", "Subquery Scan", "Result"}
+
+
+def full_scans(plan, indexes, limited=False):
+    """Tables a plan reads end to end: a sequential scan, or an index scan
+    that can't seek because nothing bounds the index's first column."""
+    node = plan["Node Type"]
+    if node == "Seq Scan":
+        # an unfiltered scan under a Limit only reads the page, no index would help
+        if not (limited and "Filter" not in plan):
+            yield plan["Relation Name"]
+    elif node in ("Index Scan", "Index Only Scan", "Bitmap Index Scan"):
+        # without a condition the index is read for its order (a page, a
+        # merge join), that's the planner's choice rather than a missing index
+        table, leading = indexes[plan["Index Name"]]
+        condition = plan.get("Index Cond")
+        if condition is not None and not re.search(rf"\b{leading}\b", condition):
+            yield table
+    limited = node == "Limit" or limited and node in STREAMING
+    for child in plan.get("Plans", []):
+        yield from full_scans(child, indexes, limited)
+
+
+def test_no_full_scans_on_large_tables(seeded, client, test_user, count_statements):
+    with count_statements() as statements:
+        responses = call_routes(client, test_user)
+    assert [(res.url, res.status_code, res.text) for res in responses if res.status_code >= 400] == []
+
+    executions = [execution for execution in statements.executions if STATEMENT.match(execution[1])]
+    executions += [(engine, statement, {}) for statement in FOREIGN_KEY_LOOKUPS]
+    sizes = dict(seeded.execute(text(
+        "SELECT relname, reltuples FROM pg_class WHERE relkind = 'r' AND relnamespace = 'public'::regnamespace")).all())
+    indexes = {index: (table, leading) for index, table, leading in seeded.execute(text("""
+        SELECT indexes.relname, tables.relname, attname FROM pg_index
+        JOIN pg_class indexes ON indexes.oid = indexrelid
+        JOIN pg_class tables ON tables.oid = indrelid
+        JOIN pg_attribute ON attrelid = indrelid AND attnum = indkey[0]
+        WHERE tables.relnamespace = 'public'::regnamespace"""))}
+
+    offenders = []
+    for (target, statement, parameters), plan in zip(executions, explain(executions)):
+        offenders += [f"{statement!r} scans all {sizes[table]:.0f} rows of {table}"
+                      for table in full_scans(plan[0]["Plan"], indexes) if sizes[table] > FULL_SCAN_THRESHOLD]
+    assert offenders == []
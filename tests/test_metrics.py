@@ -0,0 +1,40 @@
+import time
+
+from app import metrics
+
+
+def test_histogram_render():
+    histogram = metrics.Histogram("test_seconds", "Test histogram.", ("route",), buckets=(0.1, 1.0))
+    histogram.observe("/posts/", value=0.05)
+    histogram.observe("/posts/", value=0.5)
+    histogram.observe("/posts/", value=5)
+    lines = histogram.render()
+    assert 'test_seconds_bucket{route="/posts/",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{route="/posts/",le="1.0"} 2' in lines
+    assert 'test_seconds_bucket{route="/posts/",le="+Inf"} 3' in lines
+    assert 'test_seconds_count{route="/posts/"} 3' in lines
+
+
+def test_timed_excludes_nested_phases():
+    with metrics.collect_timings() as timings:
+        with metrics.timed("auth"):
+            time.sleep(0.05)
+            metrics.record("db", 0.04)
+    assert timings["db"] == 0.04
+    assert 0.01 <= timings["auth"] < 0.05
+
+
+def test_metrics_endpoint(authorized_client, test_posts):
+    authorized_client.get(f"/posts/{test_posts[0].id}")
+    authorized_client.get("/posts/123456")
+
+    res = authorized_client.get("/metrics")
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("text/plain")
+    body = res.text
+    assert 'http_requests_total{method="GET",route="/posts/{id}",status="200"}' in body
+    assert 'http_requests_total{method="GET",route="/posts/{id}",status="404"}' in body
+    assert 'http_request_duration_seconds_count{method="GET",route="/posts/{id}"}' in body
+    db_sum = next(line for line in body.splitlines() if line.startswith(
+        'http_request_phase_seconds_sum{method="GET",route="/posts/{id}",phase="db"}'))
+    assert float(db_sum.split()[-1]) > 0
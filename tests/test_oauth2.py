@@ -0,0 +1,52 @@
+import time
+
+import pytest
+from fastapi import HTTPException
+from jose import jwt
+
+from app import oauth2
+from app.config import settings
+
+
+@pytest.fixture
+def token_cache():
+    oauth2.token_cache.clear()
+    yield oauth2.token_cache
+    oauth2.token_cache.clear()
+
+
+def test_verify_access_token_is_cached(token_cache):
+    token = oauth2.create_access_token({"user_id": 42})
+    credentials_exception = HTTPException(status_code=401)
+
+    hits = token_cache.hits
+    assert oauth2.verify_access_token(token, credentials_exception).id == "42"
+    assert token_cache.hits == hits
+    assert oauth2.verify_access_token(token, credentials_exception).id == "42"
+    assert token_cache.hits == hits + 1
+
+
+def test_invalid_token_is_not_cached(token_cache):
+    token = oauth2.create_access_token({"user_id": 42})[:-2]
+    credentials_exception = HTTPException(status_code=401)
+
+    for _ in range(2):
+        with pytest.raises(HTTPException):
+            oauth2.verify_access_token(token, credentials_exception)
+    assert token_cache.stats()["size"] == 0
+
+
+def test_expired_token_is_rejected(token_cache):
+    token = jwt.encode({"user_id": 42, "exp": int(time.time()) - 1},
+                       settings.secret_key, algorithm=settings.algorithm)
+    credentials_exception = HTTPException(status_code=401)
+
+    with pytest.raises(HTTPException):
+        oauth2.verify_access_token(token, credentials_exception)
+    assert token_cache.stats()["size"] == 0
+
+
+def test_cache_stats(client):
+    res = client.get("/health/caches")
+    assert res.status_code == 200
+    assert "hits" in res.json()["caches"]["tokens"]
@@ -1,5 +1,8 @@
+import json
 import pytest
 from app import schemas
+from app.database import get_read_db
+from app.main import app
 
 
 def test_get_all_posts(authorized_client, test_posts):
@@ -14,6 +17,133 @@ def test_get_all_posts(authorized_client, test_posts):
     assert res.status_code == 200
 
 
+def test_get_posts_cursor_pagination(authorized_client, test_posts):
+    res = authorized_client.get("/posts/?limit=3")
+    assert res.status_code == 200
+    first_page = [post["Post"]["id"] for post in res.json()]
+    cursor = res.headers["X-Next-Cursor"]
+
+    res = authorized_client.get(f"/posts/?limit=3&cursor={cursor}")
+    assert res.status_code == 200
+    second_page = [post["Post"]["id"] for post in res.json()]
+
+    assert len(first_page) == 3
+    assert len(second_page) == 1
+    assert "X-Next-Cursor" not in res.headers
+    assert sorted(first_page + second_page) == sorted(
+        post.id for post in test_posts)
+
+
+def test_get_posts_cursor_exposed_cross_origin(authorized_client, test_posts):
+    res = authorized_client.get("/posts/?limit=3", headers={"Origin": "https://example.com"})
+    assert res.status_code == 200
+    exposed = [header.strip() for header in res.headers["Access-Control-Expose-Headers"].split(",")]
+    assert "X-Next-Cursor" in exposed
+    assert "ETag" in exposed
+
+
+def test_get_posts_limit_zero(authorized_client, test_posts):
+    res = authorized_client.get("/posts/?limit=0")
+    assert res.status_code == 200
+    assert res.json() == []
+    assert "X-Next-Cursor" not in res.headers
+
+
+def test_get_posts_invalid_cursor(authorized_client, test_posts):
+    res = authorized_client.get("/posts/?cursor=not-a-cursor")
+    assert res.status_code == 400
+
+
+def test_get_posts_fulltext_search(authorized_client, test_posts):
+    res = authorized_client.get("/posts/?search=contents&search_mode=fulltext")
+    assert res.status_code == 200
+    assert len(res.json()) == len(test_posts)
+
+    res = authorized_client.get("/posts/?search=first&search_mode=fulltext")
+    assert res.status_code == 200
+    assert [post["Post"]["id"] for post in res.json()] == [test_posts[0].id]
+
+
+def test_get_posts_statement_count(authorized_client, test_posts, count_statements):
+    # first request caches the current user
+    authorized_client.get("/posts/")
+
+    with count_statements() as statements:
+        res = authorized_client.get("/posts/")
+    assert res.status_code == 200
+    assert statements.count == 1
+
+    with count_statements() as statements:
+        res = authorized_client.get(f"/posts/{test_posts[0].id}")
+    assert res.status_code == 200
+    assert statements.count == 1
+
+
+def test_get_one_post_cached(authorized_client, test_posts, count_statements):
+    res = authorized_client.get(f"/posts/{test_posts[0].id}")
+    assert res.status_code == 200
+    etag = res.headers["etag"]
+
+    with count_statements() as statements:
+        cached = authorized_client.get(f"/posts/{test_posts[0].id}")
+    assert statements.count == 0
+    assert cached.json() == res.json()
+    assert cached.headers["etag"] == etag
+
+    not_modified = authorized_client.get(f"/posts/{test_posts[0].id}", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+
+
+def test_cached_routes_fill_from_primary(authorized_client, test_posts):
+    # a replica that lags behind the write that invalidated an entry must
+    # not be the one to refill it
+    class LaggingReplica:
+        def __getattr__(self, name):
+            raise AssertionError("cache filled from the replica")
+
+    async def lagging_replica():
+        yield LaggingReplica()
+
+    app.dependency_overrides[get_read_db] = lagging_replica
+    res = authorized_client.get(f"/posts/{test_posts[0].id}")
+    assert res.status_code == 200
+    res = authorized_client.get("/language_models/")
+    assert res.status_code == 200
+
+
+def test_get_one_post_cache_invalidated(authorized_client, test_posts):
+    res = authorized_client.get(f"/posts/{test_posts[0].id}")
+    etag = res.headers["etag"]
+
+    authorized_client.post("/vote/", json={"post_id": test_posts[0].id, "dir": 1})
+    res = authorized_client.get(f"/posts/{test_posts[0].id}", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.json()["votes"] == 1
+    etag = res.headers["etag"]
+
+    authorized_client.put(f"/posts/{test_posts[0].id}", json={"title": "updated title", "content": "updated content"})
+    res = authorized_client.get(f"/posts/{test_posts[0].id}", headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.json()["Post"]["title"] == "updated title"
+
+
+def test_get_posts_stream(authorized_client, test_posts, monkeypatch):
+    monkeypatch.setattr("app.config.settings.stream_chunk_size", 2)
+    expected = authorized_client.get("/posts/", params={"limit": 100}).json()
+
+    res = authorized_client.get("/posts/", params={"limit": 100, "stream": "ndjson"})
+    assert res.status_code == 200
+    assert res.headers["content-type"].startswith("application/x-ndjson")
+    assert [json.loads(line) for line in res.text.splitlines()] == expected
+
+    res = authorized_client.get("/posts/", params={"limit": 100, "stream": "json"})
+    assert res.json() == expected
+
+    res = authorized_client.get("/posts/", params={"limit": 100, "stream": "json", "search": "nothing matches"})
+    assert res.json() == []
+
+
 def test_unauthorized_user_get_all_posts(client, test_posts):
     res = client.get("/posts/")
     assert res.status_code == 401
@@ -112,6 +242,23 @@ def test_update_post(authorized_client, test_user, test_posts):
     assert updated_post.content == data['content']
 
 
+def test_write_post_statement_count(authorized_client, test_user, test_posts, count_statements):
+    # first request caches the current user
+    authorized_client.get("/posts/")
+    data = {"title": "updated title", "content": "updated content"}
+
+    with count_statements() as statements:
+        res = authorized_client.put(f"/posts/{test_posts[0].id}", json=data)
+    assert res.status_code == 200
+    assert res.json()["owner"]["email"] == test_user["email"]
+    assert statements.count == 1
+
+    with count_statements() as statements:
+        res = authorized_client.delete(f"/posts/{test_posts[0].id}")
+    assert res.status_code == 204
+    assert statements.count == 1
+
+
 def test_update_other_user_post(authorized_client, test_user, test_user2, test_posts):
     data = {
         "title": "updated title",
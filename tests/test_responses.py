@@ -0,0 +1,87 @@
+import json
+import threading
+from datetime import datetime, timezone
+from types import SimpleNamespace
+from typing import List
+
+from fastapi.encoders import jsonable_encoder
+
+from app import cache, models, schemas
+from app.config import settings
+from app.responses import ResponseCache, model_response, response_cache_ttl
+from .conftest import run_async
+
+
+def make_row(id):
+    owner = SimpleNamespace(id=1, email="owner@gmail.com",
+                            created_at=datetime(2023, 6, 1, tzinfo=timezone.utc))
+    post = SimpleNamespace(id=id, title=f"title {id}", content="content", published=True,
+                           created_at=datetime(2023, 6, 2, 12, 30, tzinfo=timezone.utc),
+                           owner_id=1, owner=owner)
+    return SimpleNamespace(Post=post, votes=id)
+
+
+def test_model_response_matches_default_encoding():
+    rows = [make_row(id) for id in range(3)]
+    res = model_response(List[schemas.PostOut], rows, headers={"X-Test": "1"})
+
+    expected = jsonable_encoder([schemas.PostOut.from_orm(row) for row in rows])
+    assert json.loads(res.body) == expected
+    assert res.headers["X-Test"] == "1"
+    assert res.media_type == "application/json"
+
+
+def test_stream_language_models(client, session, monkeypatch):
+    monkeypatch.setattr("app.config.settings.stream_chunk_size", 2)
+    session.add_all([models.LanguageModel(name=f"model {n}") for n in range(5)])
+    session.commit()
+
+    res = client.get("/language_models/", params={"stream": "ndjson", "limit": 4})
+    assert res.status_code == 200
+    assert [json.loads(line)["name"] for line in res.text.splitlines()] == [f"model {n}" for n in range(4)]
+
+    res = client.get("/language_models/", params={"stream": "json"})
+    assert res.json() == client.get("/language_models/").json()
+
+
+class RecordingRedis:
+    """Stands in for the redis client, remembers which thread made each call."""
+
+    def __init__(self):
+        self.data = {}
+        self.threads = []
+
+    def get(self, key):
+        self.threads.append(threading.get_ident())
+        return self.data.get(key)
+
+    def set(self, key, value, px=None):
+        self.threads.append(threading.get_ident())
+        self.data[key] = value
+
+
+def test_redis_response_cache_stays_off_the_loop():
+    backend = cache.RedisCache.__new__(cache.RedisCache)
+    backend.prefix, backend.ttl, backend.hits, backend.misses = "test:", 60, 0, 0
+    backend._client = RecordingRedis()
+    response_cache = ResponseCache(backend)
+
+    async def round_trip():
+        await response_cache.invalidate("language_models")
+        await backend.set_async("key", {"body": "cached"})
+        return await backend.get_async("key"), threading.get_ident()
+
+    value, loop_thread = run_async(round_trip())
+    assert value == {"body": "cached"}
+    assert len(backend._client.threads) == 3
+    assert loop_thread not in backend._client.threads
+
+
+def test_local_response_cache_ttl_is_capped(monkeypatch):
+    monkeypatch.setattr(settings, "response_cache_ttl_seconds", 300)
+    monkeypatch.setattr(settings, "response_cache_local_ttl_seconds", 5)
+    monkeypatch.setattr(settings, "cache_url", None)
+    assert response_cache_ttl() == 5
+
+    monkeypatch.setattr(settings, "cache_url", "redis://localhost:6379/0")
+    assert response_cache_ttl() == 300
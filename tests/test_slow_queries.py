@@ -0,0 +1,84 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from app.oauth2 import create_access_token
+from app.slow_queries import SlowQueryLog
+from .conftest import SQLALCHEMY_DATABASE_URL, run_async
+
+
+@pytest.fixture()
+def slow_engine():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    yield engine
+    engine.dispose()
+
+
+def test_slow_query_logged(slow_engine, caplog):
+    slow_query_log = SlowQueryLog(threshold_ms=50)
+    slow_query_log.instrument(slow_engine)
+    try:
+        with slow_engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            conn.execute(text("SELECT pg_sleep(:seconds)"), {"seconds": 0.1})
+    finally:
+        slow_query_log.remove()
+
+    [entry] = slow_query_log.recent
+    assert entry["duration_ms"] >= 100
+    assert entry["statement"] == "SELECT pg_sleep(%(seconds)s)"
+    assert entry["parameters"] == "{'seconds': 0.1}"
+    assert entry["rowcount"] == 1
+    assert "slow query" in caplog.text
+
+
+def test_slow_query_rowcount_on_async_engine():
+    slow_query_log = SlowQueryLog(threshold_ms=0)
+    engine = create_async_engine(SQLALCHEMY_DATABASE_URL.replace(
+        'postgresql://', 'postgresql+asyncpg://', 1), poolclass=NullPool)
+    slow_query_log.instrument(engine.sync_engine)
+
+    async def run_queries():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT generate_series(1, 3)"))
+            await conn.execute(text("SELECT 1 WHERE false"))
+            # rows of a server side cursor are fetched after the statement
+            await (await conn.stream(text("SELECT generate_series(1, 3)"))).all()
+
+    try:
+        run_async(run_queries())
+    finally:
+        slow_query_log.remove()
+
+    assert [entry["rowcount"] for entry in slow_query_log.recent
+            if entry["statement"].startswith("SELECT")] == [3, 0, None]
+
+
+def test_slowest_statements_explained(slow_engine):
+    slow_query_log = SlowQueryLog(threshold_ms=0, explain_top_n=2, explain_engine=slow_engine)
+    slow_query_log.instrument(slow_engine)
+    try:
+        with slow_engine.connect() as conn:
+            for seconds in (0.01, 0.05, 0.03):
+                conn.execute(text("SELECT pg_sleep(:seconds)"), {"seconds": seconds})
+            conn.execute(text("CREATE TEMP TABLE not_explained (id int)"))
+        slow_query_log.explain_pending(wait=True)
+    finally:
+        slow_query_log.remove()
+
+    assert [plan["parameters"] for plan in slow_query_log.plans] == ["{'seconds': 0.05}", "{'seconds': 0.03}"]
+    assert "Execution Time" in slow_query_log.plans[0]["plan"]
+
+
+def test_slow_queries_endpoint_superuser_only(client, test_user):
+    res = client.get("/health/slow-queries")
+    assert res.status_code == 401
+
+    token = create_access_token({"user_id": test_user['id']})
+    res = client.get("/health/slow-queries", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 403
+
+    token = create_access_token({"user_id": test_user['id'], "is_superuser": True})
+    res = client.get("/health/slow-queries", headers={"Authorization": f"Bearer {token}"})
+    assert res.status_code == 200
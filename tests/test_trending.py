@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from app import models
+from app.trending import TrendingRefresher
+from .conftest import TestingAsyncSessionLocal, run_async
+
+
+@pytest.fixture()
+def refresher():
+    return TrendingRefresher(TestingAsyncSessionLocal, interval_seconds=0, window_hours=72, gravity=1.8)
+
+
+@pytest.fixture()
+def test_votes(test_posts, session, test_user, test_user2):
+    # post 2 gets two votes, post 1 one
+    for user_id, post in ((test_user['id'], test_posts[2]), (test_user2['id'], test_posts[2]),
+                          (test_user['id'], test_posts[1])):
+        session.add(models.Vote(post_id=post.id, user_id=user_id))
+        post.vote_count += 1
+    session.commit()
+
+
+def test_trending_empty_before_refresh(authorized_client, test_posts):
+    res = authorized_client.get("/posts/trending")
+    assert res.status_code == 200
+    assert res.json() == []
+    assert "X-Trending-Refreshed-At" not in res.headers
+
+
+def test_trending_orders_by_score(authorized_client, test_posts, test_votes, refresher):
+    assert run_async(refresher.refresh()) is True
+
+    res = authorized_client.get("/posts/trending")
+    assert res.status_code == 200
+    posts = res.json()
+    assert [post["Post"]["id"] for post in posts[:2]] == [test_posts[2].id, test_posts[1].id]
+    assert [post["votes"] for post in posts[:2]] == [2, 1]
+    assert len(posts) == len(test_posts)
+    assert int(res.headers["X-Trending-Age-Seconds"]) >= 0
+    assert refresher.stats()["refreshes"] == 1
+
+
+def test_trending_decays_with_age(authorized_client, test_posts, test_votes, session, refresher):
+    # an older post needs more votes to stay ahead
+    test_posts[2].created_at = datetime.now(timezone.utc) - timedelta(hours=48)
+    session.commit()
+    run_async(refresher.refresh())
+
+    posts = authorized_client.get("/posts/trending").json()
+    assert posts[0]["Post"]["id"] == test_posts[1].id
+
+
+def test_trending_drops_posts_outside_window(authorized_client, test_posts, session, refresher):
+    run_async(refresher.refresh())
+    test_posts[0].created_at = datetime.now(timezone.utc) - timedelta(hours=100)
+    session.commit()
+    run_async(refresher.refresh())
+
+    ids = {post["Post"]["id"] for post in authorized_client.get("/posts/trending").json()}
+    assert test_posts[0].id not in ids
+    assert len(ids) == len(test_posts) - 1
+
+
+def test_trending_unauthorized_user(client, test_posts):
+    res = client.get("/posts/trending")
+    assert res.status_code == 401
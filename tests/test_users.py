@@ -1,6 +1,8 @@
 import pytest
 from jose import jwt
-from app import schemas
+from passlib.context import CryptContext
+from app import models, schemas
+from app.oauth2 import user_cache
 
 from app.config import settings
 
@@ -15,7 +17,7 @@ from app.config import settings
 
 def test_create_user(client):
     res = client.post(
-        "/users/", json={"email": "hello123@gmail.com", "password": "password123"})
+        "/users/", json={"email": "hello123@gmail.com", "password": "password123", "user_type": "Patient"})
 
     new_user = schemas.UserOut(**res.json())
     assert new_user.email == "hello123@gmail.com"
@@ -47,3 +49,87 @@ def test_incorrect_login(test_user, client, email, password, status_code):
 
     assert res.status_code == status_code
     # assert res.json().get('detail') == 'Invalid Credentials'
+
+
+def test_current_user_is_cached(authorized_client, test_user, session):
+    res = authorized_client.get("/posts/")
+    assert res.status_code == 200
+    assert user_cache.get(str(test_user['id']))["email"] == test_user['email']
+
+    user = session.query(models.User).filter(models.User.id == test_user['id']).first()
+    user.is_superuser = True
+    session.commit()
+    assert user_cache.get(str(test_user['id'])) is None
+
+
+def test_login_rehashes_outdated_password(test_user, client, session):
+    outdated_context = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4)
+    user = session.query(models.User).filter(models.User.id == test_user['id']).first()
+    user.password = outdated_context.hash(test_user['password'])
+    session.commit()
+
+    res = client.post(
+        "/login", data={"username": test_user['email'], "password": test_user['password']})
+    assert res.status_code == 200
+
+    session.refresh(user)
+    assert user.password.startswith(f"$2b${settings.bcrypt_rounds:02d}$")
+
+
+def test_login_password_pool_saturated(test_user, client, monkeypatch):
+    monkeypatch.setattr(settings, "password_hash_max_pending", 0)
+    res = client.post(
+        "/login", data={"username": test_user['email'], "password": test_user['password']})
+    assert res.status_code == 429
+    assert res.headers["Retry-After"] == "1"
+
+
+def login(client, user):
+    res = client.post("/login", data={"username": user['email'], "password": user['password']})
+    assert res.status_code == 200
+    return schemas.Token(**res.json())
+
+
+def test_refresh_rotates_token(test_user, client, monkeypatch):
+    tokens = login(client, test_user)
+    # renewing never touches bcrypt
+    monkeypatch.setattr("app.utils.verify_and_update_async", None)
+
+    res = client.post("/refresh", json={"refresh_token": tokens.refresh_token})
+    assert res.status_code == 200
+    renewed = schemas.Token(**res.json())
+    payload = jwt.decode(renewed.access_token, settings.secret_key, algorithms=[settings.algorithm])
+    assert payload["user_id"] == test_user['id']
+    assert renewed.refresh_token != tokens.refresh_token
+
+    res = client.post("/refresh", json={"refresh_token": renewed.refresh_token})
+    assert res.status_code == 200
+
+
+def test_refresh_token_reuse_revokes_family(test_user, client, session):
+    tokens = login(client, test_user)
+    other_login = login(client, test_user)
+    renewed = schemas.Token(**client.post("/refresh", json={"refresh_token": tokens.refresh_token}).json())
+
+    res = client.post("/refresh", json={"refresh_token": tokens.refresh_token})
+    assert res.status_code == 401
+    res = client.post("/refresh", json={"refresh_token": renewed.refresh_token})
+    assert res.status_code == 401
+
+    # other logins of the same user are separate families
+    res = client.post("/refresh", json={"refresh_token": other_login.refresh_token})
+    assert res.status_code == 200
+    assert session.query(models.RefreshToken).filter(models.RefreshToken.token_hash == tokens.refresh_token).first() is None
+
+
+def test_logout_revokes_refresh_token(test_user, client):
+    tokens = login(client, test_user)
+    res = client.post("/logout", json={"refresh_token": tokens.refresh_token})
+    assert res.status_code == 204
+    res = client.post("/refresh", json={"refresh_token": tokens.refresh_token})
+    assert res.status_code == 401
+
+
+def test_refresh_invalid_token(client):
+    res = client.post("/refresh", json={"refresh_token": "not-a-token"})
+    assert res.status_code == 401
@@ -1,11 +1,17 @@
+import asyncio
+import gc
+
 import pytest
 from app import models
+from app.votes import VoteBuffer
+from .conftest import TestingAsyncSessionLocal, run_async
 
 
 @pytest.fixture()
 def test_vote(test_posts, session, test_user):
     new_vote = models.Vote(post_id=test_posts[3].id, user_id=test_user['id'])
     session.add(new_vote)
+    test_posts[3].vote_count += 1
     session.commit()
 
 
@@ -15,6 +21,17 @@ def test_vote_on_post(authorized_client, test_posts):
     assert res.status_code == 201
 
 
+def test_vote_updates_vote_count(authorized_client, test_posts):
+    post_id = test_posts[3].id
+    authorized_client.post("/vote/", json={"post_id": post_id, "dir": 1})
+    res = authorized_client.get(f"/posts/{post_id}")
+    assert res.json()["votes"] == 1
+
+    authorized_client.post("/vote/", json={"post_id": post_id, "dir": 0})
+    res = authorized_client.get(f"/posts/{post_id}")
+    assert res.json()["votes"] == 0
+
+
 def test_vote_twice_post(authorized_client, test_posts, test_vote):
     res = authorized_client.post(
         "/vote/", json={"post_id": test_posts[3].id, "dir": 1})
@@ -43,3 +60,89 @@ def test_vote_unauthorized_user(client, test_posts):
     res = client.post(
         "/vote/", json={"post_id": test_posts[3].id, "dir": 1})
     assert res.status_code == 401
+
+
+def test_vote_is_a_single_statement(authorized_client, test_posts, count_statements):
+    # first request caches the current user
+    authorized_client.get("/posts/")
+
+    with count_statements() as statements:
+        res = authorized_client.post(
+            "/vote/", json={"post_id": test_posts[3].id, "dir": 1})
+    assert res.status_code == 201
+    assert statements.count == 1
+
+    with count_statements() as statements:
+        res = authorized_client.post(
+            "/vote/", json={"post_id": test_posts[3].id, "dir": 0})
+    assert res.status_code == 201
+    assert statements.count == 1
+
+
+def test_vote_batch(authorized_client, test_posts, test_vote):
+    res = authorized_client.post("/vote/batch", json=[
+        {"post_id": test_posts[0].id, "dir": 1},
+        {"post_id": test_posts[0].id, "dir": 1},
+        {"post_id": test_posts[1].id, "dir": 1},
+        {"post_id": test_posts[1].id, "dir": 0},
+        {"post_id": test_posts[3].id, "dir": 1},
+        {"post_id": test_posts[2].id, "dir": 0},
+        {"post_id": 80000, "dir": 1},
+    ])
+    assert res.status_code == 200
+    assert [result["status_code"] for result in res.json()] == [
+        201, 409, 201, 201, 409, 404, 404]
+
+    votes = {post["Post"]["id"]: post["votes"]
+             for post in authorized_client.get("/posts/").json()}
+    assert votes[test_posts[0].id] == 1
+    assert votes[test_posts[1].id] == 0
+    assert votes[test_posts[3].id] == 1
+
+
+def test_vote_batch_unauthorized_user(client, test_posts):
+    res = client.post(
+        "/vote/batch", json=[{"post_id": test_posts[3].id, "dir": 1}])
+    assert res.status_code == 401
+
+
+def test_vote_buffer_coalesces_votes(test_posts, test_user, count_statements):
+    buffer = VoteBuffer(TestingAsyncSessionLocal, window_ms=20, max_items=100)
+
+    async def submit_votes():
+        return await asyncio.gather(
+            *(buffer.submit(test_user['id'], post.id, 1) for post in test_posts),
+            buffer.submit(test_user['id'], test_posts[0].id, 1))
+
+    with count_statements() as statements:
+        results = run_async(submit_votes())
+
+    assert [result["status_code"] for result in results] == [201] * len(test_posts) + [409]
+    # the repeated vote lands in a second round of the same flush
+    assert statements.count == 2
+
+
+def test_vote_buffer_drain(test_posts, test_user):
+    buffer = VoteBuffer(TestingAsyncSessionLocal, window_ms=10000, max_items=100)
+
+    async def submit_and_drain():
+        vote = asyncio.ensure_future(buffer.submit(test_user['id'], test_posts[0].id, 1))
+        # the timer's flush is far off, drain applies the vote now
+        await asyncio.sleep(0)
+        await buffer.drain()
+        return await asyncio.wait_for(vote, timeout=1)
+
+    assert run_async(submit_and_drain())["status_code"] == 201
+
+
+def test_vote_buffer_flush_survives_gc(test_posts, test_user):
+    buffer = VoteBuffer(TestingAsyncSessionLocal, window_ms=20, max_items=1)
+
+    async def submit_vote():
+        vote = asyncio.ensure_future(buffer.submit(test_user['id'], test_posts[0].id, 1))
+        await asyncio.sleep(0)
+        # nothing but the buffer refers to the flush the vote waits on
+        gc.collect()
+        return await asyncio.wait_for(vote, timeout=5)
+
+    assert run_async(submit_vote())["status_code"] == 201